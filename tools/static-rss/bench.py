@@ -0,0 +1,139 @@
+# Benchmark the stages of the static-rss content pipeline over the checked-in corpus:
+#
+#     uv run tools/static-rss/bench.py
+#
+# /// script
+# dependencies = [
+#  "feedparser==6.0.11",
+#  "html2text==2024.2.26",
+#  "markdown==3.7",
+#  "python-dateutil==2.9.0.post0",
+#  "requests==2.32.3",
+# ]
+# ///
+
+import sys
+import time
+import argparse
+import statistics
+import importlib.util
+from pathlib import Path
+from typing import Callable
+from dataclasses import dataclass
+
+# gen.py is a script rather than a module, so load it from its path.
+spec = importlib.util.spec_from_file_location("gen", Path(__file__).parent / "gen.py")
+gen = importlib.util.module_from_spec(spec)
+sys.modules["gen"] = gen
+spec.loader.exec_module(gen)
+
+import markdown
+import html2text
+
+CORPUS = Path(__file__).parent / "corpus" / "entries"
+
+
+@dataclass
+class Stage:
+    name: str
+    # prepare the input of this stage from the raw entry HTML,
+    # so that only the stage itself is timed.
+    prepare: Callable[[str], str]
+    run: Callable[[str], object]
+
+
+STAGES = [
+    Stage(
+        "sanitize",
+        prepare=lambda content: content,
+        run=gen.sanitize_entry_html,
+    ),
+    Stage(
+        "html2text",
+        prepare=gen.sanitize_entry_html,
+        run=html2text.html2text,
+    ),
+    Stage(
+        "markdown",
+        prepare=lambda content: gen.unmark_doc_tags(html2text.html2text(gen.sanitize_entry_html(content))),
+        run=markdown.markdown,
+    ),
+    Stage(
+        "clean",
+        prepare=lambda content: gen.convert_html(content)[1],
+        run=gen.clean_entry_html,
+    ),
+    Stage(
+        "convert",
+        prepare=lambda content: content,
+        run=gen.convert_html,
+    ),
+]
+
+
+@dataclass
+class Result:
+    stage: str
+    calls: int
+    bytes: int
+    total: float
+    p95: float
+
+
+def bench_stage(stage: Stage, entries: list[str], iterations: int) -> Result:
+    inputs = [stage.prepare(entry) for entry in entries]
+
+    # warm up caches (regex compilation, imports) before measuring.
+    for value in inputs:
+        stage.run(value)
+
+    durations = []
+    size = 0
+    for _ in range(iterations):
+        for value in inputs:
+            start = time.perf_counter()
+            stage.run(value)
+            durations.append(time.perf_counter() - start)
+            size += len(value.encode("utf-8"))
+
+    return Result(
+        stage=stage.name,
+        calls=len(durations),
+        bytes=size,
+        total=sum(durations),
+        p95=statistics.quantiles(durations, n=20)[18] if len(durations) > 1 else durations[0],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the static-rss content pipeline over a corpus of entry HTML.")
+    parser.add_argument("--corpus", type=Path, default=CORPUS, help="directory of entry HTML files")
+    parser.add_argument("--iterations", type=int, default=20, help="number of passes over the corpus per stage")
+    parser.add_argument("--stage", action="append", choices=[stage.name for stage in STAGES], help="stage to run (default: all)")
+    args = parser.parse_args()
+
+    paths = sorted(args.corpus.glob("*.html"))
+    if not paths:
+        parser.error(f"no entries found in {args.corpus}")
+
+    entries = [path.read_text(encoding="utf-8") for path in paths]
+    print(f"corpus: {len(entries)} entries, {sum(len(entry.encode('utf-8')) for entry in entries) / 1024:.1f} KiB")
+    print()
+    print(f"{'stage':<12} {'entries/s':>12} {'MB/s':>10} {'mean (ms)':>10} {'p95 (ms)':>10}")
+
+    for stage in STAGES:
+        if args.stage and stage.name not in args.stage:
+            continue
+
+        result = bench_stage(stage, entries, args.iterations)
+        print(
+            f"{result.stage:<12} "
+            f"{result.calls / result.total:>12.1f} "
+            f"{result.bytes / result.total / 1_000_000:>10.2f} "
+            f"{result.total / result.calls * 1000:>10.3f} "
+            f"{result.p95 * 1000:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,17 @@
 #
 #     uv run tools/static-rss/gen.py /path/to/opml
 #
+# pass `--cache /path/to/cache.sqlite` to reuse feed bodies across runs
+# via conditional GET (ETag/Last-Modified), and to poll quiet or failing feeds
+# less often than every run (`--poll-all` to fetch everything anyway).
+#
+# with `--serve --cache ... --output feed.html`, it stays running instead, polling each feed
+# when it's due, and rewriting the output only when the visible entries change.
+#
+# feeds that advertise a WebSub hub can be pushed to rather than polled: run the receiver
+# with `--cache ... --websub-listen HOST:PORT`, and pass `--websub-callback URL` (its public URL)
+# to the runs that render the feeds, which subscribe to the hubs and render from the pushed content.
+#
 # /// script
 # dependencies = [
 #  "feedparser==6.0.11",
@@ -9,41 +20,692 @@
 #  "markdown==3.7",
 #  "python-dateutil==2.9.0.post0",
 #  "requests==2.32.3",
+#  # lets requests negotiate and decode brotli-compressed responses
+#  "brotli==1.2.0",
 # ]
 # ///
 
+from __future__ import annotations
+
+import os
 import sys
 import html
+import html.parser
+import io
+import json
+import time
+import hmac
+import hashlib
 import logging
+import argparse
+import threading
 import datetime
 import itertools
+import collections
 import urllib.error
-import concurrent.futures
+import urllib.parse
 import re
 from pathlib import Path
-from typing import Iterator, Optional
-from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, TextIO, TypeVar
+from dataclasses import dataclass, field, asdict, replace
 
-import markdown
-import requests
-import html2text
-import feedparser
-import dateutil.parser
-import xml.etree.ElementTree as ET
+# the third-party dependencies, and the slower parts of the standard library,
+# are imported where they're used, so that importing this module (for tests and benchmarks)
+# and running `--help` stay fast.
+if TYPE_CHECKING:
+    import asyncio
+    import sqlite3
+    import concurrent.futures
+
+    import requests
 
 
 logger = logging.getLogger("gen")
-logging.basicConfig(level=logging.DEBUG)
 
 # number of days to look back for recent entries
 RECENT_DAYS = 3
 
+# size, in bytes, to which entries are shortened when the output is over its total budget.
+EXCERPT_MIN_BYTES = 512
+
 # some feeds publish events way far in the future.
 # this is the number of hours to accept pre-published.
 FUTURE_TOLERANCE_HOURS = 4
 
-# Global list to track feeds with no entries for summary
-feeds_with_no_entries = []
+# feeds that haven't posted recently are polled less often than every run, but at least this often,
+# so that a new post still shows up well within the window of recent entries.
+MAX_POLL_DELAY = datetime.timedelta(days=1)
+# feeds that fail are backed off, starting from this delay and doubling with each consecutive failure.
+FAILURE_POLL_DELAY = datetime.timedelta(hours=3)
+MAX_FAILURE_POLL_DELAY = datetime.timedelta(days=7)
+# runs are scheduled every few hours but start a little early or late,
+# so a feed due shortly after the run starts is polled now rather than a whole run later.
+POLL_SLACK = datetime.timedelta(minutes=30)
+
+# feeds that advertise a WebSub hub are subscribed to for this long, and resubscribed
+# when the lease is about to run out. while subscribed, they aren't polled.
+WEBSUB_LEASE = datetime.timedelta(days=10)
+WEBSUB_RENEW_BEFORE = datetime.timedelta(days=2)
+# a hub that hasn't verified a subscription request by now probably never will, so ask again.
+WEBSUB_RETRY_DELAY = datetime.timedelta(hours=12)
+
+# `--serve` wakes up when the next feed is due, but at least this often, since entries age out of the window,
+# and no more often than this, when feeds are due in quick succession.
+SERVE_MAX_SLEEP = datetime.timedelta(minutes=30)
+SERVE_MIN_SLEEP = datetime.timedelta(minutes=1)
+# `--serve` reloads the OPML file and starred repositories this often.
+SERVE_RELOAD_DELAY = datetime.timedelta(hours=3)
+
+T = TypeVar("T")
+
+
+class Cache:
+    """
+    Persistent state shared across runs, backed by a single SQLite database.
+
+    This holds:
+      - the last response body for each feed URL, along with its HTTP validators,
+        so that unchanged feeds can be revalidated with a conditional GET
+        rather than downloaded again, and
+      - the converted HTML of recent entries, so that entries seen on a previous run
+        don't have to go through html2text/markdown again, and
+      - the polling history of each feed (newest entry, typical posting interval,
+        consecutive failures), used to decide when the feed is next worth fetching, and
+      - the recent entries parsed from the last body of each feed, so that a body
+        that hasn't changed (but was sent again anyway) doesn't have to be parsed again, and
+      - the WebSub hub of each feed that advertises one, and the state of the subscription to it.
+        Content pushed by the hub is merged into the cached body of the feed (see `WebSubReceiver`).
+    """
+
+    def __init__(self, path: Path):
+        import sqlite3
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # feeds are fetched from many threads, so share one connection behind a lock.
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock:
+            columns = {row["name"] for row in self.db.execute("PRAGMA table_info(content)")}
+            if columns and "sanitized_bytes" not in columns:
+                # from before content was sanitized, so every row is stale anyway.
+                self.db.execute("DROP TABLE content")
+            columns = {row["name"] for row in self.db.execute("PRAGMA table_info(http)")}
+            if columns and "capped" not in columns:
+                self.db.execute("ALTER TABLE http ADD COLUMN capped INTEGER NOT NULL DEFAULT 0")
+            if columns and "location" not in columns:
+                self.db.execute("ALTER TABLE http ADD COLUMN location TEXT")
+            columns = {row["name"]: row for row in self.db.execute("PRAGMA table_info(websub)")}
+            if columns and columns["callback_key"]["notnull"]:
+                # from when callback keys were derived from the feed URL, so could be guessed.
+                # the subscriptions are requested again.
+                self.db.execute("DROP TABLE websub")
+
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS http (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    fetched_at TEXT NOT NULL,
+                    -- the body was cut off at the byte limit, so it ends mid-entry.
+                    capped INTEGER NOT NULL DEFAULT 0,
+                    -- the URL the body came from, after redirects, which relative links are resolved against.
+                    location TEXT
+                )
+            """)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS content (
+                    feed_url TEXT NOT NULL,
+                    entry_id TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    first_line TEXT NOT NULL,
+                    html TEXT NOT NULL,
+                    sanitized_bytes INTEGER NOT NULL,
+                    PRIMARY KEY (feed_url, entry_id, content_hash)
+                )
+            """)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS health (
+                    url TEXT PRIMARY KEY,
+                    polled_at TEXT NOT NULL,
+                    next_poll TEXT NOT NULL,
+                    last_entry TEXT,
+                    interval_seconds REAL,
+                    failures INTEGER NOT NULL
+                )
+            """)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS parsed (
+                    url TEXT PRIMARY KEY,
+                    body_hash TEXT NOT NULL,
+                    parsed_at TEXT NOT NULL,
+                    stats TEXT NOT NULL,
+                    entries TEXT NOT NULL
+                )
+            """)
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS websub (
+                    url TEXT PRIMARY KEY,
+                    hub TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    -- random, so that only the hub knows the callback URL; set when a subscription is requested.
+                    callback_key TEXT UNIQUE,
+                    secret TEXT,
+                    requested_at TEXT,
+                    lease_expires TEXT
+                )
+            """)
+
+    def get_response(self, url: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT etag, last_modified, content_type, body, capped, location FROM http WHERE url = ?", (url,)
+            ).fetchone()
+
+    def put_response(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        content_type: Optional[str],
+        body: bytes,
+        capped: bool = False,
+        location: Optional[str] = None,
+    ):
+        fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.lock:
+            self.db.execute(
+                """
+                INSERT OR REPLACE INTO http (url, etag, last_modified, content_type, body, fetched_at, capped, location)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (url, etag, last_modified, content_type, body, fetched_at, int(capped), location),
+            )
+
+    def update_validators(self, url: str, etag: Optional[str], last_modified: Optional[str]):
+        fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.lock:
+            self.db.execute(
+                "UPDATE http SET etag = ?, last_modified = ?, fetched_at = ? WHERE url = ?",
+                (etag, last_modified, fetched_at, url),
+            )
+
+    def get_content(self, feed_url: str, entry_id: str, content_hash: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT first_line, html, sanitized_bytes FROM content WHERE feed_url = ? AND entry_id = ? AND content_hash = ?",
+                (feed_url, entry_id, content_hash),
+            ).fetchone()
+
+    def put_content(
+        self,
+        feed_url: str,
+        entry_id: str,
+        content_hash: str,
+        timestamp: datetime.datetime,
+        first_line: str,
+        html: str,
+        sanitized_bytes: int,
+    ):
+        with self.lock:
+            self.db.execute(
+                """
+                INSERT OR REPLACE INTO content (feed_url, entry_id, content_hash, timestamp, first_line, html, sanitized_bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (feed_url, entry_id, content_hash, normalize_timestamp(timestamp).isoformat(), first_line, html, sanitized_bytes),
+            )
+
+    def evict_content(self, before: datetime.datetime) -> int:
+        """Remove converted content for entries older than the given timestamp, returning the number removed."""
+        with self.lock:
+            cursor = self.db.execute(
+                "DELETE FROM content WHERE timestamp < ?",
+                (normalize_timestamp(before).isoformat(),),
+            )
+            return cursor.rowcount
+
+    def get_parsed(self, url: str, body_hash: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT stats, entries FROM parsed WHERE url = ? AND body_hash = ?", (url, body_hash)
+            ).fetchone()
+
+    def put_parsed(self, url: str, body_hash: str, stats: dict, entries: list[dict]):
+        parsed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self.lock:
+            self.db.execute(
+                """
+                INSERT OR REPLACE INTO parsed (url, body_hash, parsed_at, stats, entries)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (url, body_hash, parsed_at, json.dumps(stats), json.dumps(entries)),
+            )
+
+    def evict_parsed(self, before: datetime.datetime) -> int:
+        """Remove parsed entries of feeds last parsed before the given timestamp, returning the number removed."""
+        with self.lock:
+            cursor = self.db.execute(
+                "DELETE FROM parsed WHERE parsed_at < ?",
+                (normalize_timestamp(before).isoformat(),),
+            )
+            return cursor.rowcount
+
+    def get_health(self, url: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT polled_at, next_poll, last_entry, interval_seconds, failures FROM health WHERE url = ?", (url,)
+            ).fetchone()
+
+    def put_health(
+        self,
+        url: str,
+        polled_at: datetime.datetime,
+        next_poll: datetime.datetime,
+        last_entry: Optional[datetime.datetime],
+        interval_seconds: Optional[float],
+        failures: int,
+    ):
+        with self.lock:
+            self.db.execute(
+                """
+                INSERT OR REPLACE INTO health (url, polled_at, next_poll, last_entry, interval_seconds, failures)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    url,
+                    normalize_timestamp(polled_at).isoformat(),
+                    normalize_timestamp(next_poll).isoformat(),
+                    normalize_timestamp(last_entry).isoformat() if last_entry else None,
+                    interval_seconds,
+                    failures,
+                ),
+            )
+
+    def put_websub_hub(self, url: str, hub: str, topic: str):
+        """Record the hub advertised by a feed, forgetting any subscription to a different hub or topic."""
+        with self.lock:
+            self.db.execute(
+                """
+                INSERT INTO websub (url, hub, topic) VALUES (?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    hub = excluded.hub,
+                    topic = excluded.topic,
+                    callback_key = NULL,
+                    secret = NULL,
+                    requested_at = NULL,
+                    lease_expires = NULL
+                WHERE hub != excluded.hub OR topic != excluded.topic
+                """,
+                (url, hub, topic),
+            )
+
+    def get_websub(self, url: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT url, hub, topic, callback_key, secret, requested_at, lease_expires FROM websub WHERE url = ?", (url,)
+            ).fetchone()
+
+    def get_websub_by_callback_key(self, callback_key: str) -> Optional[sqlite3.Row]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT url, hub, topic, callback_key, secret, requested_at, lease_expires FROM websub WHERE callback_key = ?",
+                (callback_key,),
+            ).fetchone()
+
+    def put_websub_request(self, url: str, callback_key: str, secret: str, requested_at: datetime.datetime):
+        """Record that a subscription was requested from the hub, which has yet to verify it."""
+        with self.lock:
+            self.db.execute(
+                "UPDATE websub SET callback_key = ?, secret = ?, requested_at = ? WHERE url = ?",
+                (callback_key, secret, normalize_timestamp(requested_at).isoformat(), url),
+            )
+
+    def put_websub_lease(self, url: str, lease_expires: Optional[datetime.datetime]):
+        """
+        Record the lease granted by the hub once it verifies the subscription, or None when it denies it.
+        Either way, the request is no longer pending, so can't be verified again.
+        """
+        with self.lock:
+            self.db.execute(
+                "UPDATE websub SET lease_expires = ?, requested_at = NULL WHERE url = ?",
+                (normalize_timestamp(lease_expires).isoformat() if lease_expires else None, url),
+            )
+
+
+class HttpArchive:
+    """
+    HTTP responses saved to a directory, so that a run can be replayed later without network access.
+
+    Each response is keyed by its request method and URL, and stored as a JSON file
+    with the status and headers alongside a file with the (decoded) body.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _key(self, method: str, url: str) -> str:
+        return hashlib.sha256(f"{method} {url}".encode("utf-8")).hexdigest()
+
+    def start(self, recorded_at: datetime.datetime):
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / "archive.json").write_text(json.dumps({"recorded_at": recorded_at.isoformat()}))
+
+    @property
+    def recorded_at(self) -> datetime.datetime:
+        manifest = json.loads((self.path / "archive.json").read_text())
+        return datetime.datetime.fromisoformat(manifest["recorded_at"])
+
+    def save(self, method: str, url: str, status: int, reason: Optional[str], headers: dict[str, str], body: bytes):
+        key = self._key(method, url)
+        (self.path / f"{key}.body").write_bytes(body)
+        (self.path / f"{key}.json").write_text(json.dumps({
+            "method": method,
+            "url": url,
+            "status": status,
+            "reason": reason,
+            "headers": headers,
+        }, indent=2))
+
+    def load(self, method: str, url: str) -> Optional[tuple[dict, bytes]]:
+        key = self._key(method, url)
+        try:
+            meta = json.loads((self.path / f"{key}.json").read_text())
+            body = (self.path / f"{key}.body").read_bytes()
+        except FileNotFoundError:
+            return None
+        return meta, body
+
+
+# the body is stored decoded, and its length may differ from what the server sent.
+ARCHIVE_DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# conditional requests would capture 304s, which can't be replayed without the cache that produced them.
+ARCHIVE_STRIPPED_REQUEST_HEADERS = ("If-None-Match", "If-Modified-Since")
+
+
+class RecordingAdapter:
+    """
+    Send requests to the network, saving every response to an archive.
+
+    Like the other adapters here, this wraps an HTTPAdapter, rather than subclassing it,
+    so that requests isn't imported until an adapter is created.
+    """
+
+    def __init__(self, archive: HttpArchive, **kwargs):
+        import requests.adapters
+
+        self.adapter = requests.adapters.HTTPAdapter(**kwargs)
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        for name in ARCHIVE_STRIPPED_REQUEST_HEADERS:
+            request.headers.pop(name, None)
+
+        response = self.adapter.send(request, **kwargs)
+        self.archive.save(
+            request.method,
+            request.url,
+            response.status_code,
+            response.reason,
+            {k: v for k, v in response.headers.items() if k.lower() not in ARCHIVE_DROPPED_HEADERS},
+            response.content,
+        )
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter:
+    """Serve responses from an archive rather than the network."""
+
+    def __init__(self, archive: HttpArchive, **kwargs):
+        import requests.adapters
+
+        # only used to build responses; it never sends anything.
+        self.adapter = requests.adapters.HTTPAdapter(**kwargs)
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        import urllib3
+        import requests
+
+        recorded = self.archive.load(request.method, request.url)
+        if recorded is None:
+            raise requests.ConnectionError(f"not in archive: {request.method} {request.url}", request=request)
+
+        meta, body = recorded
+        raw = urllib3.HTTPResponse(
+            body=io.BytesIO(body),
+            headers=meta["headers"],
+            status=meta["status"],
+            reason=meta["reason"],
+            preload_content=False,
+        )
+        return self.adapter.build_response(request, raw)
+
+    def close(self):
+        self.adapter.close()
+
+
+# all HTTP requests go through this session, so that they can be recorded or replayed,
+# and so that connections (and their TLS sessions) are kept alive and reused across feeds on the same host.
+# Accept-Encoding is left to requests, which offers gzip, deflate, and brotli (when installed).
+# created by `get_session`, on first use.
+session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    global session
+    if session is None:
+        import requests
+
+        session = requests.Session()
+    return session
+
+
+# the session keeps a connection pool per host, evicting the least recently used beyond this many.
+# there are about as many hosts as feeds, so keep them all rather than closing connections mid-run.
+POOL_HOSTS = 256
+
+
+def get_default_headers() -> dict[str, str]:
+    """headers sent with every feed request, unless overridden by a profile below."""
+    import feedparser
+
+    return {
+        "User-Agent": feedparser.USER_AGENT,
+        "Accept": feedparser.http.ACCEPT_HEADER,
+    }
+
+
+# headers sent with feed requests by host, applied to the host and its subdomains.
+# more can be provided via --header-profiles.
+HEADER_PROFILES: dict[str, dict[str, str]] = {
+    # reddit rejects unfamiliar user agents.
+    "reddit.com": {
+        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    },
+}
+
+
+def get_request_headers(url: str, profiles: dict[str, dict[str, str]] = HEADER_PROFILES) -> dict[str, str]:
+    """Pick the headers for a feed request, merging the profiles that match its host, most specific last."""
+    host = (urllib.parse.urlsplit(url).hostname or "").lower()
+
+    headers = get_default_headers()
+    for profile_host in sorted(profiles, key=len):
+        if host == profile_host or host.endswith("." + profile_host):
+            headers.update(profiles[profile_host])
+    return headers
+
+
+# set from the command line, below.
+cache: Optional[Cache] = None
+
+# seconds to wait for a server to accept a connection or send more data.
+fetch_timeout: float = 30
+
+# bytes of a feed body to download before giving up on the rest, or None for no limit.
+max_feed_bytes: Optional[int] = None
+
+# worker processes for content conversion, or None to convert on the calling thread.
+converter: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+# entries matching any of these are dropped, see `load_rules`.
+filter_rules: list[FilterRule] = []
+
+
+@dataclass
+class FeedStats:
+    """
+    Timings and counts collected while fetching, parsing, and converting a single feed.
+
+    requests doesn't expose DNS and connection setup separately, so `wait_seconds`
+    covers everything from sending the request until the response headers arrive.
+    """
+    status: Optional[int] = None
+    not_modified: bool = False
+    # size of the (decompressed) response body, or of the cached body when not modified.
+    bytes: int = 0
+    # the body was cut off at the byte limit.
+    capped: bool = False
+    # bytes at the end of the body that weren't parsed, because their entries were too old or incomplete.
+    truncated_bytes: int = 0
+    wait_seconds: float = 0.0
+    transfer_seconds: float = 0.0
+    # parsing includes filtering entries, but not converting their content.
+    parse_seconds: float = 0.0
+    convert_seconds: float = 0.0
+    total_entries: int = 0
+    recent_entries: int = 0
+    rendered_entries: int = 0
+    # entries whose content wasn't found in the cache, so had to be converted.
+    converted_entries: int = 0
+    # bytes of markup removed from the converted content of the rendered entries, see `clean_entry_html`.
+    sanitized_bytes: int = 0
+    error: Optional[str] = None
+    timed_out: bool = False
+    # not fetched, because the feed wasn't due to be polled; parsed from the cached body instead.
+    skipped: bool = False
+    # not polled because its hub pushes new content, which is merged into the cached body.
+    subscribed: bool = False
+    # the body was the same as last time, so its entries were reused rather than parsed again.
+    reused: bool = False
+    # entries too far in the future to show yet.
+    future_entries: int = 0
+    # entries dropped because a feed of higher priority has the same entry, see `EntryIndex`.
+    duplicate_entries: int = 0
+    # entries dropped by each filter rule, by name.
+    filtered_entries: dict[str, int] = field(default_factory=dict)
+    # newest entry timestamp and median interval between entries, across all the entries in the feed.
+    newest_entry: Optional[datetime.datetime] = None
+    interval_seconds: Optional[float] = None
+
+    @property
+    def total_seconds(self) -> float:
+        return self.wait_seconds + self.transfer_seconds + self.parse_seconds + self.convert_seconds
+
+
+def fetch_url(
+    url: str,
+    headers: dict[str, str],
+    timeout: float = 30,
+    stats: Optional[FeedStats] = None,
+    max_bytes: Optional[int] = None,
+) -> tuple[bytes, dict[str, str]]:
+    """
+    Fetch the body of the given URL, revalidating against the cache when possible.
+
+    Returns the body and the response headers that feedparser uses to decode it
+    (content type and location, for resolving relative links).
+    When the server responds 304 Not Modified, the cached body is returned.
+    When `stats` is provided, the status, size, and timings of the request are recorded there.
+
+    When the body is longer than `max_bytes`, only that much is downloaded and returned,
+    and `stats.capped` is set.
+    """
+    stats = stats or FeedStats()
+    headers = dict(headers)
+
+    cached = cache.get_response(url) if cache else None
+    if cached is not None:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    # stream, so that waiting for the response can be told apart from reading its body.
+    started = time.perf_counter()
+    try:
+        response = get_session().get(url, headers=headers, timeout=timeout, stream=True)
+    finally:
+        # recorded on failure too, so that hosts that hang until the timeout stand out.
+        stats.wait_seconds = time.perf_counter() - started
+    stats.status = response.status_code
+
+    # read the body even when it's not used (304s, errors),
+    # which releases the connection back to the pool for the next feed on this host.
+    started = time.perf_counter()
+    chunks = []
+    size = 0
+    for chunk in response.iter_content(64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            logger.warning("feed exceeds %d bytes, truncating: %s", max_bytes, url)
+            stats.capped = True
+            # the rest of the body is unread, so the connection can't be reused.
+            response.close()
+            break
+    content = b"".join(chunks)[:max_bytes]
+    stats.transfer_seconds = time.perf_counter() - started
+
+    if response.status_code == 304 and cached is not None:
+        logger.debug("not modified: %s", url)
+        # servers may rotate validators on a 304, so keep whatever is newest.
+        cache.update_validators(
+            url,
+            response.headers.get("ETag") or cached["etag"],
+            response.headers.get("Last-Modified") or cached["last_modified"],
+        )
+        body = cached["body"]
+        content_type = cached["content_type"]
+        location = cached["location"] or url
+        stats.not_modified = True
+        # the cached body may itself have been cut off, which parsing has to know.
+        stats.capped = bool(cached["capped"])
+    else:
+        response.raise_for_status()
+        body = content
+        content_type = response.headers.get("Content-Type")
+        # after redirects.
+        location = response.url
+        if cache:
+            cache.put_response(
+                url,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                content_type,
+                body,
+                capped=stats.capped,
+                location=location,
+            )
+
+    stats.bytes = len(body)
+
+    return body, get_response_headers(location, content_type)
+
+
+def get_response_headers(url: str, content_type: Optional[str]) -> dict[str, str]:
+    response_headers = {"content-location": url}
+    if content_type:
+        response_headers["content-type"] = content_type
+    return response_headers
 
 
 def normalize_timestamp(ts: datetime.datetime) -> datetime.datetime:
@@ -52,139 +714,1075 @@ def normalize_timestamp(ts: datetime.datetime) -> datetime.datetime:
     return ts.astimezone(datetime.timezone.utc)
 
 
-def remove_heading_links(html_content):
+# bump this when the conversion pipeline changes, to invalidate previously converted content.
+CONVERSION_VERSION = 4
+
+
+def hash_body(body: bytes, rules_hash: str = "") -> str:
+    """hash a raw feed body, along with the version of the pipeline and the filter rules that its entries went through"""
+    return hashlib.sha256(f"{CONVERSION_VERSION}\0{rules_hash}\0".encode("ascii") + body).hexdigest()
+
+
+def hash_content(kind: str, value: str) -> str:
+    """Identify raw entry content, and the version of the pipeline that converts it, for caching."""
+    return hashlib.sha256(f"{CONVERSION_VERSION}\0{kind}\0{value}".encode("utf-8")).hexdigest()
+
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# elements that have no end tag.
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# elements whose content is not HTML, and so never contains documentation text.
+RAW_TEXT_TAGS = {"script", "style"}
+
+# Target common HTML element names that appear in documentation
+DOC_ELEMENTS = r'table|thead|tbody|tfoot|tr|td|th|video|audio|img|input|button|form|div|span|p|br|hr|meta|link|script|style|iframe|canvas|svg|figure|figcaption|details|summary|dialog|template|slot|select|option|textarea|label|fieldset|legend|datalist|output|progress|meter|nav|header|footer|main|section|article|aside|ul|ol|li|dl|dt|dd|pre|code|blockquote|cite|abbr|address|time|mark|del|ins|sub|sup|small|strong|em|b|i|u|s|q|dfn|var|samp|kbd|data|ruby|rt|rp|bdi|bdo|wbr|area|map|track|source|embed|object|param|picture|portal|noscript|base|head|title|body|html|colgroup|col|caption'
+
+# matches escaped <element> and </element>, without attributes, once text is re-escaped.
+ESCAPED_DOC_TAG_PATTERN = re.compile(r'&lt;(/?)(' + DOC_ELEMENTS + r')&gt;', re.IGNORECASE)
+
+# private-use characters that stand in for the brackets of documentation tag names
+# while the content passes through html2text, which would otherwise unescape them.
+DOC_TAG_OPEN = "\ue000"
+DOC_TAG_CLOSE = "\ue001"
+
+
+@dataclass
+class Token:
+    # one of: "start", "end", "startend", "data", "other"
+    kind: str
+    # lowercase element name for tags, otherwise None
+    tag: Optional[str]
+    # the source text of the token
+    raw: str
+    # attributes of start tags, with entities decoded
+    attrs: list[tuple[str, Optional[str]]] = field(default_factory=list)
+
+
+class HtmlTokenizer(html.parser.HTMLParser):
     """
-    Remove anchor links from headings (h1-h6) in HTML content.
-    This preserves the heading text but removes any nested anchor links.
-    Must handle both wrapped links and empty anchor tags that become problematic in markdown.
+    Split HTML into a flat list of tokens that concatenate back to the original text.
+
+    Each token keeps its source text, so markup that isn't rewritten
+    passes through untouched rather than being re-serialized.
     """
-    # Handle HTML anchor links that wrap heading text
-    wrapped_link_pattern = r'(<h[1-6][^>]*>)\s*<a[^>]*>([^<]*)</a>\s*(</h[1-6]>)'
-    
-    def replace_wrapped_link(match):
-        opening_tag = match.group(1)
-        text_content = match.group(2)
-        closing_tag = match.group(3)
-        return f"{opening_tag}{text_content}{closing_tag}"
-    
-    content = re.sub(wrapped_link_pattern, replace_wrapped_link, html_content, flags=re.IGNORECASE)
-    
-    # Handle empty anchor tags within headings (critical for Rust Blog and similar)
-    # Pattern: <h4 id="..."><a class="anchor" href="..."></a>\n text content</h4>
-    empty_anchor_pattern = r'(<h[1-6][^>]*>)\s*<a[^>]*></a>\s*([\s\S]*?)(</h[1-6]>)'
-    
-    def replace_empty_anchor(match):
-        opening_tag = match.group(1)
-        text_content = match.group(2)
-        closing_tag = match.group(3)
+
+    def __init__(self, source: str):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        self.line_offsets = [0] + [m.end() for m in re.finditer("\n", source)]
+        # (kind, tag, offset into source, attrs)
+        self.starts: list[tuple[str, Optional[str], int, list]] = []
+
+    def add(self, kind: str, tag: Optional[str] = None, attrs: Optional[list] = None):
+        # during a callback, the position is the start of the current token.
+        line, column = self.getpos()
+        self.starts.append((kind, tag, self.line_offsets[line - 1] + column, attrs or []))
+
+    def handle_starttag(self, tag, attrs):
+        self.add("start", tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.add("startend", tag, attrs)
+
+    def handle_endtag(self, tag):
+        self.add("end", tag)
+
+    def handle_data(self, data):
+        self.add("data")
+
+    def handle_comment(self, data):
+        self.add("other")
+
+    def handle_decl(self, decl):
+        self.add("other")
+
+    def handle_pi(self, data):
+        self.add("other")
+
+    def unknown_decl(self, data):
+        self.add("other")
+
+    def tokenize(self) -> list[Token]:
+        self.feed(self.source)
+        self.close()
+
+        tokens = []
+        if not self.starts or self.starts[0][2] != 0:
+            tokens.append(Token("data", None, self.source[:self.starts[0][2] if self.starts else len(self.source)]))
+
+        for i, (kind, tag, offset, attrs) in enumerate(self.starts):
+            end = self.starts[i + 1][2] if i + 1 < len(self.starts) else len(self.source)
+            tokens.append(Token(kind, tag, self.source[offset:end], attrs))
+
+        return tokens
+
+
+def mark_doc_tags(raw: str) -> str:
+    """
+    Mark HTML tag-like text, such as "the &lt;table&gt; element", in the given raw text.
+
+    html2text unescapes &lt;table&gt; to <table>, which then gets interpreted
+    as an actual HTML element when markdown.markdown() processes it.
+    So the brackets of common element names, which are likely meant to be shown
+    as text examples in documentation, are swapped for placeholders
+    that `unmark_doc_tags` turns back into entities once html2text is done.
+    """
+    if "&" not in raw:
+        # tag-like text can only be written with entities.
+        return raw
+
+    text = html.unescape(raw)
+    if "<" not in text:
+        return raw
+
+    escaped = html.escape(text, quote=False)
+    marked = ESCAPED_DOC_TAG_PATTERN.sub(DOC_TAG_OPEN + r"\1\2" + DOC_TAG_CLOSE, escaped)
+    if marked == escaped:
+        return raw
+
+    return marked
+
+
+def unmark_doc_tags(md_text: str) -> str:
+    return md_text.replace(DOC_TAG_OPEN, "&lt;").replace(DOC_TAG_CLOSE, "&gt;")
+
+
+def has_text(tokens: list[Token]) -> bool:
+    return any(token.kind == "data" and token.raw.strip() for token in tokens)
+
+
+def is_anchor(token: Token, kind: str) -> bool:
+    return token.kind == kind and token.tag == "a"
+
+
+def rewrite_heading(children: list[Token], escape_tags: bool) -> str:
+    """
+    Remove anchor links from the content of a heading (h1-h6), preserving the heading text.
+
+    Handles:
+      - headings that are entirely a link: `<h2><a href="...">text</a></h2>`
+      - permalinks before the text, typically empty: `<h4 id="..."><a class="anchor" href="..."></a>\n text</h4>`
+        (critical for Rust Blog and similar)
+      - permalinks after the text, typically a symbol or an icon: `<h2>text <a href="#...">#</a></h2>`
+        (Servo uses an icon, which html2text would otherwise render as a broken markdown link)
+      - any other links within the heading, which are unwrapped.
+    """
+    def render(tokens: list[Token]) -> str:
+        return "".join(
+            mark_doc_tags(token.raw) if escape_tags and token.kind == "data" else token.raw
+            for token in tokens
+        )
+
+    # whitespace around the heading content doesn't matter when matching the patterns below.
+    lo, hi = 0, len(children)
+    while lo < hi and children[lo].kind == "data" and not children[lo].raw.strip():
+        lo += 1
+    while hi > lo and children[hi - 1].kind == "data" and not children[hi - 1].raw.strip():
+        hi -= 1
+    content = children[lo:hi]
+
+    # heading that is entirely a link to its text: keep the text as-is.
+    if (
+        len(content) >= 2
+        and is_anchor(content[0], "start")
+        and is_anchor(content[-1], "end")
+        and all(token.kind == "data" for token in content[1:-1])
+    ):
+        return render(content[1:-1])
+
+    collapse = False
+
+    if content and is_anchor(content[0], "start"):
+        close = next((i for i, token in enumerate(content) if is_anchor(token, "end")), None)
+        if close is not None and not has_text(content[1:close]):
+            content = content[close + 1:]
+            collapse = True
+
+    if content and is_anchor(content[-1], "end"):
+        open_ = next((i for i in range(len(content) - 1, -1, -1) if is_anchor(content[i], "start")), None)
+        if open_ is not None:
+            inner = content[open_ + 1:-1]
+            if all(token.kind == "data" for token in inner) or not has_text(inner):
+                content = content[:open_]
+                collapse = True
+
+    if not collapse:
+        content = children
+
+    # unwrap any remaining links, so they don't become markdown links in the heading.
+    text = render([token for token in content if token.tag != "a"])
+
+    if collapse:
         # Clean up whitespace and newlines in the text content
-        clean_text = re.sub(r'\s+', ' ', text_content.strip())
-        return f"{opening_tag}{clean_text}{closing_tag}"
-    
-    content = re.sub(empty_anchor_pattern, replace_empty_anchor, content, flags=re.IGNORECASE | re.DOTALL)
-    
-    # Handle anchor links at the end of headings (common pattern: heading text <a href="#anchor">#</a>)
-    # Pattern: <h4 id="...">text content<a href="...">link text</a></h4>
-    trailing_anchor_pattern = r'(<h[1-6][^>]*>)([\s\S]*?)<a[^>]*>[^<]*</a>\s*(</h[1-6]>)'
-    
-    def replace_trailing_anchor(match):
-        opening_tag = match.group(1)
-        text_content = match.group(2)
-        closing_tag = match.group(3)
-        # Clean up whitespace and remove any remaining anchor artifacts
-        clean_text = re.sub(r'\s+', ' ', text_content.strip())
-        return f"{opening_tag}{clean_text}{closing_tag}"
-    
-    content = re.sub(trailing_anchor_pattern, replace_trailing_anchor, content, flags=re.IGNORECASE | re.DOTALL)
-    
-    return content
+        text = re.sub(r'\s+', ' ', text.strip())
 
+    return text
 
-def clean_markdown_links_from_headings(html_content):
+
+def sanitize_entry_html(content: str, escape_tags: bool = True) -> str:
     """
-    Clean up any malformed markdown links in headings after markdown processing.
-    This handles cases where html2text->markdown conversion created problems.
+    Prepare entry HTML for conversion to markdown, in a single pass over the document:
+      - remove anchor links from headings, see `rewrite_heading`, and
+      - when `escape_tags` is set, mark documentation tag names in text, see `mark_doc_tags`.
     """
-    # Pattern: heading with [](...) that may be broken across elements
-    markdown_link_pattern = r'(<h[1-6][^>]*>)\s*\[\]\([^)]*\)\s*(.*?)(</h[1-6]>)'
-    
-    def replace_markdown_link(match):
-        opening_tag = match.group(1)
-        text_content = match.group(2)
-        closing_tag = match.group(3)
-        # Remove any remaining markup and clean text
-        clean_text = re.sub(r'<[^>]*>', '', text_content).strip()
-        return f"{opening_tag}{clean_text}{closing_tag}"
-    
-    content = re.sub(markdown_link_pattern, replace_markdown_link, html_content, flags=re.IGNORECASE | re.DOTALL)
-    
-    # Handle any remaining markdown link artifacts in headings
-    # Pattern: heading with markdown link remnants like [text](url) or [](...)
-    general_markdown_pattern = r'(<h[1-6][^>]*>)([\s\S]*?)\[[^\]]*\]\([^\)]*\)([\s\S]*?)(</h[1-6]>)'
-    
-    def replace_general_markdown(match):
-        opening_tag = match.group(1)
-        text_before = match.group(2)
-        text_after = match.group(3)
-        closing_tag = match.group(4)
-        # Combine text content, removing the markdown link
-        combined_text = (text_before + text_after).strip()
-        clean_text = re.sub(r'<[^>]*>', '', combined_text).strip()
-        clean_text = re.sub(r'\s+', ' ', clean_text)
-        return f"{opening_tag}{clean_text}{closing_tag}"
-    
-    content = re.sub(general_markdown_pattern, replace_general_markdown, content, flags=re.IGNORECASE | re.DOTALL)
-    
-    return content
+    tokens = HtmlTokenizer(content).tokenize()
+
+    out = []
+    raw_text_tag = None
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+
+        if token.kind == "start" and token.tag in HEADING_TAGS:
+            # find the end of the heading; a heading that is never closed is left alone.
+            end = None
+            for j in range(i + 1, len(tokens)):
+                if tokens[j].tag in HEADING_TAGS and tokens[j].kind in ("start", "end"):
+                    if tokens[j].kind == "end":
+                        end = j
+                    break
+
+            if end is not None:
+                out.append(token.raw)
+                out.append(rewrite_heading(tokens[i + 1:end], escape_tags))
+                out.append(tokens[end].raw)
+                i = end + 1
+                continue
+
+        if token.kind == "start" and token.tag in RAW_TEXT_TAGS:
+            raw_text_tag = token.tag
+        elif token.kind == "end" and token.tag == raw_text_tag:
+            raw_text_tag = None
+
+        if escape_tags and token.kind == "data" and raw_text_tag is None:
+            out.append(mark_doc_tags(token.raw))
+        else:
+            out.append(token.raw)
+
+        i += 1
+
+    return "".join(out)
+
+
+def convert_html(content: str) -> tuple[str, str]:
+    """
+    Convert entry HTML into clean HTML by round-tripping it through markdown.
+    Returns the intermediate markdown (useful for deriving a title) and the HTML.
+    """
+    # danger: injection
+    # content_html = html.unescape(content.value)
+
+    import markdown
+    import html2text
+
+    # unwrapped, since wrapping can start a line with "#", "1." or ">", which markdown then reads as markup.
+    content_md = html2text.html2text(sanitize_entry_html(content), bodywidth=0)
+    # Re-escape HTML tags that appear as text examples (e.g., <table>)
+    content_md = unmark_doc_tags(content_md)
+    content_html = markdown.markdown(content_md)
+
+    return content_md, content_html
+
+
+def convert_summary(summary: str) -> str:
+    """Convert an entry summary, which is typically a short HTML snippet, into clean HTML."""
+    import markdown
+
+    return markdown.markdown(sanitize_entry_html(summary, escape_tags=False))
+
+
+# elements (and their attributes) that are kept in converted content; other elements are unwrapped,
+# keeping their text, unless they're in DROPPED_TAGS.
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "caption", "cite", "code", "dd", "del", "details", "dfn",
+    "div", "dl", "dt", "em", "figcaption", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "hr",
+    "i", "img", "ins", "kbd", "li", "mark", "ol", "p", "pre", "q", "s", "samp", "small", "span",
+    "strong", "sub", "summary", "sup", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "u",
+    "ul", "var",
+}
+ALLOWED_ATTRIBUTES = {
+    # mastodon relies on classes to hide parts of long links.
+    "a": {"href", "title", "class"},
+    "span": {"class"},
+    # language hints for syntax highlighting.
+    "code": {"class"},
+    "abbr": {"title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "ol": {"start"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+URL_ATTRIBUTES = {"href", "src"}
+# schemes allowed in URLs, where "" is a relative URL. notably not data: or javascript:.
+ALLOWED_URL_SCHEMES = {"", "http", "https", "mailto"}
+
+# elements that are removed along with their content: active content, embeds, and heavy inline media.
+DROPPED_TAGS = {
+    "script", "style", "iframe", "frame", "frameset", "object", "embed", "applet", "svg", "math",
+    "canvas", "video", "audio", "source", "track", "template", "noscript", "form", "input", "button",
+    "select", "textarea", "link", "meta", "base", "head", "title",
+}
+
+
+def is_allowed_url(url: str) -> bool:
+    return urllib.parse.urlsplit(url.strip()).scheme.lower() in ALLOWED_URL_SCHEMES
+
+
+def clean_entry_html(content: str) -> tuple[str, int]:
+    """
+    Reduce converted entry HTML to an allowlist of elements and attributes, see `ALLOWED_TAGS`,
+    dropping scripts, embeds, styles, and data: URIs, and letting the browser load images lazily.
+
+    Returns the HTML and the number of bytes (UTF-8) removed.
+    """
+    out = []
+    removed = 0
+    # the element being dropped along with its content, and how deeply it's nested in itself.
+    dropping = None
+    depth = 0
+
+    for token in HtmlTokenizer(content).tokenize():
+        if dropping is not None:
+            removed += len(token.raw.encode("utf-8"))
+            if token.tag == dropping and token.kind == "start":
+                depth += 1
+            elif token.tag == dropping and token.kind == "end":
+                depth -= 1
+                if depth == 0:
+                    dropping = None
+            continue
+
+        if token.kind == "data":
+            out.append(token.raw)
+            continue
+
+        if token.kind == "other" or token.tag not in ALLOWED_TAGS:
+            # comments and declarations, and elements that are dropped or unwrapped.
+            removed += len(token.raw.encode("utf-8"))
+            if token.kind == "start" and token.tag in DROPPED_TAGS and token.tag not in VOID_TAGS:
+                dropping = token.tag
+                depth = 1
+            continue
+
+        if token.kind == "end":
+            out.append(token.raw)
+            continue
+
+        attrs = [
+            (name, value)
+            for name, value in token.attrs
+            if name in ALLOWED_ATTRIBUTES.get(token.tag, ())
+            and value is not None
+            and (name not in URL_ATTRIBUTES or is_allowed_url(value))
+        ]
+
+        if token.tag == "img":
+            if not any(name == "src" for name, _ in attrs):
+                # such as an image inlined as a data: URI.
+                removed += len(token.raw.encode("utf-8"))
+                continue
+            attrs += [("loading", "lazy"), ("decoding", "async")]
+
+        rebuilt = "<" + token.tag + "".join(f' {name}="{html.escape(value)}"' for name, value in attrs) + (" />" if token.kind == "startend" else ">")
+        removed += max(0, len(token.raw.encode("utf-8")) - len(rebuilt.encode("utf-8")))
+        out.append(rebuilt)
+
+    return "".join(out), removed
+
+
+def get_raw_content(entry) -> tuple[str, str]:
+    """
+    Pick the content of an RSS/Atom entry (as parsed by feedparser) to render.
+    Returns the kind of content ("html", "text", "summary", or "empty") and its raw value.
+    """
+    if hasattr(entry, "content"):
+        # only render the first content element
+        content = entry.content[0]
+        if content.type in ("text/html", "application/xhtml+xml"):
+            return "html", content.value
+
+        elif content.type == "text/plain":
+            return "text", content.value
+
+        else:
+            raise ValueError("unexpected content type: " + content.type)
+
+    elif hasattr(entry, "summary"):
+        return "summary", entry.summary
 
+    elif hasattr(entry, "title"):
+        return "empty", ""
 
-def fix_broken_heading_elements(html_content):
+    else:
+        logger.warning("post has no content")
+        return "empty", ""
+
+
+def convert_content(kind: str, value: str) -> tuple[str, str, int]:
     """
-    Fix headings that got broken across multiple HTML elements.
-    This handles cases where heading content got split, like:
-    <h2>Text [ __](url-part-</h2><p>url-continued)</p>
+    Render raw entry content, as returned by `get_raw_content`, as HTML,
+    reduced to an allowlist of markup by `clean_entry_html`.
+
+    Also returns the first line of the content as text,
+    which serves as the title of posts that don't have one (like mastodon posts),
+    and the number of bytes removed by `clean_entry_html`.
     """
-    # Pattern: heading with markdown link ending in dash, followed by paragraph with closing parenthesis
-    # This specifically targets the issue we saw with Servo blog entries
-    broken_heading_pattern = r'(<h[1-6][^>]*>)(.*?)\[[^\]]*\]\([^)]*-(</h[1-6]>)\s*<p>([^)]*\)[^<]*)</p>'
-    
-    def fix_broken_heading(match):
-        opening_tag = match.group(1)   # <h2>
-        heading_text = match.group(2)  # 'Highlights '
-        closing_tag = match.group(3)   # </h2>
-        # group(4) is the <p> content with the URL continuation - we ignore it
-        
-        # Clean up the heading text by removing any remaining HTML and extra whitespace
-        clean_text = re.sub(r'<[^>]*>', '', heading_text).strip()
-        clean_text = re.sub(r'\s+', ' ', clean_text)
-        
-        return f"{opening_tag}{clean_text}{closing_tag}"
-    
-    return re.sub(broken_heading_pattern, fix_broken_heading, html_content, flags=re.IGNORECASE | re.DOTALL)
+    if kind == "html":
+        content_md, content_html = convert_html(value)
+        first_line = content_md.partition("\n")[0]
+
+    elif kind == "text":
+        import markdown
+
+        first_line, content_html = value.partition("\n")[0], markdown.markdown(value)
+
+    elif kind == "summary":
+        first_line, content_html = "", convert_summary(value)
+
+    elif kind == "empty":
+        return "", "<i>(empty)</i>", 0
+
+    else:
+        raise ValueError("unexpected content kind: " + kind)
+
+    content_html, removed = clean_entry_html(content_html)
+    return first_line, content_html, removed
 
 
-def escape_html_tags_in_markdown(md_text):
+def run_conversion(kind: str, value: str) -> tuple[str, str, int]:
     """
-    Re-escape HTML tag-like patterns in markdown text.
+    Convert raw entry content via `convert_content`, in a worker process if a pool is configured.
 
-    html2text unescapes &lt;table&gt; to <table>, which then gets interpreted
-    as an actual HTML element when markdown.markdown() processes it.
-    This function re-escapes common HTML element names that are likely meant
-    to be shown as text examples in documentation.
+    html2text and markdown are pure Python and hold the GIL,
+    so conversion on the fetch threads would otherwise be serialized onto a single core.
+    """
+    if converter is None:
+        return convert_content(kind, value)
+
+    return converter.submit(convert_content, kind, value).result()
+
+
+def excerpt_html(content: str, budget: int, link: str) -> str:
     """
-    # Target common HTML element names that appear in documentation
-    doc_elements = r'table|thead|tbody|tfoot|tr|td|th|video|audio|img|input|button|form|div|span|p|br|hr|meta|link|script|style|iframe|canvas|svg|figure|figcaption|details|summary|dialog|template|slot|select|option|textarea|label|fieldset|legend|datalist|output|progress|meter|nav|header|footer|main|section|article|aside|ul|ol|li|dl|dt|dd|pre|code|blockquote|cite|abbr|address|time|mark|del|ins|sub|sup|small|strong|em|b|i|u|s|q|dfn|var|samp|kbd|data|ruby|rt|rp|bdi|bdo|wbr|area|map|track|source|embed|object|param|picture|portal|noscript|base|head|title|body|html|colgroup|col|caption'
+    Shorten entry HTML to about `budget` bytes (UTF-8) of its source, cut between tokens
+    or at a word break, closing the elements left open so that the excerpt is still well-formed.
+    When the content is shortened, a link to continue reading the entry is appended.
+    """
+    if len(content.encode("utf-8")) <= budget:
+        return content
+
+    out: list[Token] = []
+    # open elements, innermost last.
+    open_tags: list[str] = []
+    size = 0
+    for token in HtmlTokenizer(content).tokenize():
+        token_size = len(token.raw.encode("utf-8"))
+        if size + token_size > budget:
+            if token.kind == "data":
+                # keep the words that fit. entities never contain whitespace, so they're never split.
+                remaining = token.raw.encode("utf-8")[:budget - size].decode("utf-8", "ignore")
+                words, space, _ = remaining.rpartition(" ")
+                if space:
+                    out.append(Token("data", None, words + "…"))
+            break
 
-    # Escape <element> patterns - opening tags without attributes
-    md_text = re.sub(r'<(' + doc_elements + r')>', r'&lt;\1&gt;', md_text, flags=re.IGNORECASE)
-    # Escape </element> - closing tags
-    md_text = re.sub(r'</(' + doc_elements + r')>', r'&lt;/\1&gt;', md_text, flags=re.IGNORECASE)
+        out.append(token)
+        size += token_size
 
-    return md_text
+        if token.kind == "start" and token.tag not in VOID_TAGS:
+            open_tags.append(token.tag)
+        elif token.kind == "end" and token.tag in open_tags:
+            # also closes any elements left open inside it, as browsers do.
+            del open_tags[len(open_tags) - 1 - open_tags[::-1].index(token.tag):]
+
+    # drop elements that were opened just before the cut, and so would be empty.
+    while out and open_tags and out[-1].kind == "start" and out[-1].tag == open_tags[-1]:
+        out.pop()
+        open_tags.pop()
+
+    return "".join(
+        [token.raw for token in out]
+        + [f"</{tag}>" for tag in reversed(open_tags)]
+        + [f'<p class="continue-reading"><a href="{html.escape(link)}">continue reading</a></p>']
+    )
+
+
+def is_within_window(timestamp: datetime.datetime, now: datetime.datetime) -> bool:
+    """only show entries within the past few days, and avoid far-future posts"""
+    timestamp = normalize_timestamp(timestamp)
+    recent_cutoff = (now - datetime.timedelta(days=RECENT_DAYS)).date()
+    future_cutoff = now + datetime.timedelta(hours=FUTURE_TOLERANCE_HOURS)
+    return timestamp.date() >= recent_cutoff and timestamp <= future_cutoff
+
+
+def is_before_window(timestamp: datetime.datetime, now: datetime.datetime) -> bool:
+    """is the entry too old to be shown? unlike `is_within_window`, future entries aren't."""
+    return normalize_timestamp(timestamp).date() < (now - datetime.timedelta(days=RECENT_DAYS)).date()
+
+
+# feeds are assumed to list their entries newest first, so once this many entries before the window
+# have been seen, the rest are too old to show. a few are kept, rather than just one,
+# to tolerate slightly unordered (or pinned) entries and to learn how often the feed posts.
+TRUNCATE_AFTER_OLD_ENTRIES = 5
+
+# a complete RSS <item> or Atom <entry>, allowing for namespace prefixes.
+FEED_ENTRY_PATTERN = re.compile(rb"<((?:[\w.-]+:)?(?:item|entry))[\s>].*?</\1\s*>", re.DOTALL)
+FEED_ENTRY_DATE_PATTERN = re.compile(rb"<(?:[\w.-]+:)?(?:pubDate|published|updated|date)(?:\s[^>]*)?>\s*([^<]+?)\s*<")
+FEED_ROOT_PATTERN = re.compile(rb"<([\w.:-]+)[\s>/]")
+
+
+# formats of feed timestamps, tried in order when feedparser can't parse a timestamp itself,
+# with the timezone to assume when the format doesn't include one.
+TIMESTAMP_FORMATS: list[tuple[str, Optional[datetime.tzinfo]]] = [
+    # RFC 822, as in RSS
+    ("%a, %d %b %Y %H:%M:%S %z", None),
+    ("%a, %d %b %Y %H:%M:%S GMT", datetime.timezone.utc),
+    ("%a, %d %b %Y %H:%M:%S UTC", datetime.timezone.utc),
+    ("%d %b %Y %H:%M:%S %z", None),
+    # RFC 3339, as in Atom
+    ("%Y-%m-%dT%H:%M:%S%z", None),
+    ("%Y-%m-%dT%H:%M:%S.%f%z", None),
+    ("%Y-%m-%d %H:%M:%S%z", None),
+    ("%Y-%m-%dT%H:%M:%S", None),
+    ("%Y-%m-%d", None),
+]
+
+# midnight at the end of a day, which RFC 822 and RFC 3339 both allow.
+END_OF_DAY_PATTERN = re.compile(r"(?<![\d:])24:00(?::00)?(?![\d:])")
+
+
+class TimestampParser:
+    """
+    Parse the timestamps of a feed's entries, cheaply in the common case:
+
+      1. the timestamp feedparser already parsed, when it could, then
+      2. the format that last worked for this feed, then the others in `TIMESTAMP_FORMATS`, then
+      3. dateutil, which handles nearly anything but is much slower.
+
+    Midnight written as 24:00 is the end of the day, so it becomes 00:00 of the next day.
+    """
+
+    def __init__(self):
+        # index into TIMESTAMP_FORMATS of the format that last worked.
+        self.format: Optional[int] = None
+
+    def parse_entry(self, entry) -> datetime.datetime:
+        """the published (or, failing that, updated) timestamp of an entry parsed by feedparser."""
+        if "published" in entry:
+            value, parsed = entry.published, entry.get("published_parsed")
+        else:
+            value, parsed = entry.updated, entry.get("updated_parsed")
+
+        if parsed is not None:
+            # feedparser converts to UTC.
+            return datetime.datetime(*parsed[:6], tzinfo=datetime.timezone.utc)
+        return self.parse(value)
+
+    def parse(self, value: str) -> datetime.datetime:
+        """Parse a timestamp string, raising ValueError (or OverflowError) when it isn't one."""
+        value = value.strip()
+        value, end_of_day = END_OF_DAY_PATTERN.subn("00:00:00", value, count=1)
+
+        timestamp = self.parse_format(value)
+        if timestamp is None:
+            import dateutil.parser
+
+            timestamp = dateutil.parser.parse(value)
+
+        if end_of_day:
+            timestamp += datetime.timedelta(days=1)
+        return timestamp
+
+    def parse_format(self, value: str) -> Optional[datetime.datetime]:
+        candidates = range(len(TIMESTAMP_FORMATS))
+        if self.format is not None:
+            candidates = [self.format, *(i for i in candidates if i != self.format)]
+
+        for i in candidates:
+            format, tz = TIMESTAMP_FORMATS[i]
+            try:
+                timestamp = datetime.datetime.strptime(value, format)
+            except ValueError:
+                continue
+            self.format = i
+            return timestamp.replace(tzinfo=tz) if tz is not None else timestamp
+        return None
+
+
+def get_feed_entry_timestamp(raw_entry: bytes, timestamps: Optional[TimestampParser] = None) -> Optional[datetime.datetime]:
+    """Find the timestamp of a raw RSS/Atom entry, without parsing it as XML."""
+    match = FEED_ENTRY_DATE_PATTERN.search(raw_entry)
+    if not match:
+        return None
+
+    try:
+        return (timestamps or TimestampParser()).parse(match.group(1).decode("utf-8", "replace"))
+    except (ValueError, OverflowError):
+        return None
+
+
+def truncate_feed(
+    body: bytes,
+    now: datetime.datetime,
+    incomplete: bool = False,
+    timestamps: Optional[TimestampParser] = None,
+) -> bytes:
+    """
+    Cut the body of an RSS/Atom feed after the first few entries that are too old to show as of `now`,
+    and close the document, so that feedparser doesn't parse (and build) the full post history
+    that some feeds include.
+
+    When the body is known to be `incomplete` (cut off at the byte limit),
+    it's also cut after its last complete entry and closed.
+
+    Returns the body unchanged when there's nothing to cut, or the feed can't be scanned,
+    such as when it isn't in an ASCII-compatible encoding.
+    """
+    if body.startswith((b"\xfe\xff", b"\xff\xfe")):
+        # UTF-16
+        return body
+
+    end = None
+    old_entries = 0
+    for match in FEED_ENTRY_PATTERN.finditer(body):
+        end = match.end()
+        timestamp = get_feed_entry_timestamp(match.group(0), timestamps)
+        if timestamp is not None and is_before_window(timestamp, now):
+            old_entries += 1
+            if old_entries >= TRUNCATE_AFTER_OLD_ENTRIES:
+                break
+    else:
+        if not incomplete:
+            return body
+
+    if end is None:
+        # no complete entries, so let feedparser make what it can of it.
+        return body
+
+    # the document element, skipping the XML declaration, comments, and doctype.
+    root = None
+    for match in FEED_ROOT_PATTERN.finditer(body, 0, end):
+        root = match.group(1).decode("ascii", "replace")
+        break
+    if root is None:
+        return body
+
+    if root == "rss":
+        closing = "</channel></rss>"
+    else:
+        # Atom <feed> and RSS 1.0 <rdf:RDF>, whose items are direct children.
+        closing = f"</{root}>"
+
+    return body[:end] + closing.encode("ascii")
+
+
+FEED_ENTRY_ID_PATTERN = re.compile(rb"<(?:[\w.-]+:)?(?:id|guid)(?:\s[^>]*)?>\s*([^<]+?)\s*<")
+
+
+def get_feed_entry_key(raw_entry: bytes) -> bytes:
+    """Identify a raw feed entry by its id (Atom) or guid (RSS), or by its bytes if it has neither."""
+    match = FEED_ENTRY_ID_PATTERN.search(raw_entry)
+    return match.group(1) if match else raw_entry
+
+
+def merge_feed_entries(body: bytes, pushed: bytes) -> bytes:
+    """
+    Merge the entries of a feed document pushed by a WebSub hub into the last body of the feed.
+
+    Hubs push either the whole feed or just the new and updated entries, so pushed entries
+    replace those with the same id and go first, as the newest. The oldest entries are dropped
+    so that the merged feed lists no more entries than it did (or than were pushed).
+
+    Like `truncate_feed`, this works on the raw bytes, relying on entries being well-formed
+    and not nested, so that the rest of the document (and its namespaces) is left as it was.
+    """
+    pushed_entries = [match.group(0) for match in FEED_ENTRY_PATTERN.finditer(pushed)]
+    if not pushed_entries:
+        return body
+
+    existing = list(FEED_ENTRY_PATTERN.finditer(body))
+    if not existing:
+        # nothing to merge into.
+        return pushed
+
+    pushed_keys = {get_feed_entry_key(entry) for entry in pushed_entries}
+    kept = [match.group(0) for match in existing if get_feed_entry_key(match.group(0)) not in pushed_keys]
+    merged = (pushed_entries + kept)[:max(len(existing), len(pushed_entries))]
+    return body[:existing[0].start()] + b"\n".join(merged) + body[existing[-1].end():]
+
+
+# query parameters that only track where a link was shared, so don't tell entries apart.
+TRACKING_PARAMETER_PATTERN = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|source)$")
+# titles with fewer words than this ("v1.2.0", "Weekly update") are too generic to match entries by.
+# only alphabetic words count, since the parts of a version number ("Release 1.2.0") don't make a title specific.
+TITLE_FINGERPRINT_MIN_WORDS = 4
+# links in Mastodon posts, other than those to mentioned accounts and hashtags, which are links to what's being shared.
+SHARED_LINK_PATTERN = re.compile(r"<a\s[^>]*>", re.IGNORECASE)
+LINK_HREF_PATTERN = re.compile(r"""\bhref\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+LINK_MENTION_PATTERN = re.compile(r"""\bclass\s*=\s*["'][^"']*\b(?:mention|hashtag)\b""", re.IGNORECASE)
+
+
+def canonicalize_link(link: str) -> str:
+    """
+    Reduce a link to what identifies the page it links to:
+    no scheme, "www.", fragment, trailing slash, or tracking parameters, and the rest of the query sorted.
+    """
+    parts = urllib.parse.urlsplit(link.strip())
+    host = (parts.hostname or "").removeprefix("www.")
+    if parts.port:
+        host += f":{parts.port}"
+    query = urllib.parse.urlencode(sorted(
+        (name, value)
+        for name, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAMETER_PATTERN.match(name)
+    ))
+    return host + (parts.path.rstrip("/") or "/") + (f"?{query}" if query else "")
+
+
+def get_title_fingerprint(title: str) -> Optional[str]:
+    """Normalize a title for matching, ignoring case and punctuation, or None when it's too generic to match on."""
+    words = re.findall(r"\w+", title.lower())
+    if sum(1 for word in words if word.isalpha()) < TITLE_FINGERPRINT_MIN_WORDS:
+        return None
+    return " ".join(words)
+
+
+def get_entry_keys(link: Optional[str], title: Optional[str], shared: str = "") -> list[str]:
+    """
+    Identify an entry for matching it against the entries of other feeds, before it's converted:
+    by its canonical link and title fingerprint, and by the canonical links of what it shares,
+    given the raw HTML of a post whose title isn't known until it's converted.
+    """
+    keys = []
+    if link:
+        keys.append("link:" + canonicalize_link(link))
+    if title and (fingerprint := get_title_fingerprint(title)):
+        keys.append("title:" + fingerprint)
+
+    host = urllib.parse.urlsplit(link or "").hostname
+    for tag in SHARED_LINK_PATTERN.findall(shared):
+        match = LINK_HREF_PATTERN.search(tag)
+        if not match or LINK_MENTION_PATTERN.search(tag):
+            continue
+        href = html.unescape(match.group(1))
+        # links back to the post's own server are to tags, accounts, and media.
+        if urllib.parse.urlsplit(href).scheme in ("http", "https") and urllib.parse.urlsplit(href).hostname != host:
+            keys.append("link:" + canonicalize_link(href))
+    return keys
+
+
+# the rules file used unless --rules says otherwise.
+RULES = Path(__file__).parent / "rules.toml"
+
+# the predicates a filter rule can have: each field of an entry can be compared
+# exactly, by substring, or by regular expression (searched, not matched).
+RULE_PREDICATES: dict[str, tuple[str, Callable[[str], Callable[[str], object]]]] = {
+    f"{name}{suffix}": (name, compile_predicate)
+    for name in ("title", "link", "author")
+    for suffix, compile_predicate in (
+        ("", lambda pattern: lambda value: value == pattern),
+        ("_contains", lambda pattern: lambda value: pattern in value),
+        ("_regex", lambda pattern: re.compile(pattern).search),
+    )
+}
+
+
+@dataclass
+class FilterRule:
+    """
+    A rule from the rules file. Entries that match all of its predicates are dropped,
+    from the named feed or, without one, from every feed.
+    """
+    name: str
+    # title or URL of the feed to which the rule applies.
+    feed: Optional[str]
+    # the entry field each predicate applies to, and the compiled predicate.
+    predicates: list[tuple[str, Callable[[str], object]]]
+    # the rule as written, to tell when the rules have changed.
+    source: dict = field(repr=False)
+
+    def matches(self, feed: Feed, title: Optional[str], link: Optional[str], author: Optional[str]) -> bool:
+        """does the entry match? fields that aren't known (yet) match no predicate."""
+        if self.feed is not None and self.feed not in (feed.title, feed.url):
+            return False
+        fields = {"title": title, "link": link, "author": author}
+        return all(fields[name] is not None and predicate(fields[name]) for name, predicate in self.predicates)
+
+
+def load_rules(path: Path) -> list[FilterRule]:
+    """
+    Load and compile the filter rules from a TOML file, each an entry of its `rule` array:
+
+        [[rule]]
+        name = "ghostty tip"
+        feed = "ghostty-org/ghostty"
+        title_contains = "Ghostty Tip"
+
+    Raises ValueError when a rule is malformed.
+    """
+    import tomllib
+
+    try:
+        document = tomllib.loads(path.read_text(encoding="utf-8"))
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"{path}: {e}") from e
+
+    if unknown := set(document) - {"rule"}:
+        raise ValueError(f"{path}: unexpected keys: {', '.join(sorted(unknown))}")
+
+    rules = []
+    for i, table in enumerate(document.get("rule", [])):
+        name = table.get("name") or f"rule {i + 1}"
+        feed = table.get("feed")
+        predicates = []
+        for key, pattern in table.items():
+            if key in ("name", "feed"):
+                continue
+            if key not in RULE_PREDICATES:
+                raise ValueError(f"{path}: {name}: unknown predicate: {key}")
+            if not isinstance(pattern, str):
+                raise ValueError(f"{path}: {name}: {key} must be a string")
+            field_name, compile_predicate = RULE_PREDICATES[key]
+            try:
+                predicates.append((field_name, compile_predicate(pattern)))
+            except re.error as e:
+                raise ValueError(f"{path}: {name}: {key}: {e}") from e
+        if not predicates:
+            raise ValueError(f"{path}: {name}: no predicates")
+        rules.append(FilterRule(name=name, feed=feed, predicates=predicates, source=table))
+    return rules
+
+
+def hash_rules(rules: list[FilterRule]) -> str:
+    return hashlib.sha256(json.dumps([rule.source for rule in rules], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_poll_delay(
+    now: datetime.datetime,
+    last_entry: Optional[datetime.datetime],
+    interval_seconds: Optional[float],
+    failures: int,
+) -> datetime.timedelta:
+    """
+    Decide how long to wait before fetching a feed again, given its polling history.
+
+    Feeds that are failing back off exponentially. Feeds that posted within the window
+    are polled every run; quieter feeds are polled less often the longer they've been
+    quiet and the less often they usually post, up to `MAX_POLL_DELAY`.
+    """
+    if failures > 0:
+        # cap the exponent, since the backoff is capped anyway.
+        return min(FAILURE_POLL_DELAY * 2 ** min(failures - 1, 16), MAX_FAILURE_POLL_DELAY)
+
+    if last_entry is None:
+        # no dated entries at all.
+        return MAX_POLL_DELAY
+
+    quiet = now - normalize_timestamp(last_entry)
+    if quiet < datetime.timedelta(days=RECENT_DAYS):
+        return datetime.timedelta(0)
+
+    if interval_seconds is not None:
+        quiet = min(quiet, datetime.timedelta(seconds=interval_seconds))
+    return min(quiet / 4, MAX_POLL_DELAY)
+
+
+def is_due(health: Optional[sqlite3.Row], now: datetime.datetime, slack: datetime.timedelta = POLL_SLACK) -> bool:
+    """should the feed with the given polling history be fetched in a run at `now`?"""
+    if health is None:
+        return True
+    return datetime.datetime.fromisoformat(health["next_poll"]) <= now + slack
+
+
+def get_websub_links(d) -> tuple[Optional[str], Optional[str]]:
+    """Find the WebSub hub advertised by a parsed feed, and the topic (self) URL to subscribe to."""
+    hub, topic = None, None
+    for link in d.feed.get("links", []):
+        if link.get("rel") == "hub" and not hub:
+            hub = link.get("href")
+        elif link.get("rel") == "self" and not topic:
+            topic = link.get("href")
+    return hub, topic
+
+
+def is_subscribed(subscription: Optional[sqlite3.Row], now: datetime.datetime) -> bool:
+    """does the hub of the feed push its new content, so that the feed needn't be polled?"""
+    if subscription is None or not subscription["lease_expires"]:
+        return False
+    return datetime.datetime.fromisoformat(subscription["lease_expires"]) > now
+
+
+def needs_websub_request(subscription: sqlite3.Row, now: datetime.datetime) -> bool:
+    """should a subscription (or renewal) be requested from the hub of the feed?"""
+    if subscription["requested_at"] and datetime.datetime.fromisoformat(subscription["requested_at"]) > now - WEBSUB_RETRY_DELAY:
+        # still waiting on the hub to verify the last request.
+        return False
+    if not subscription["lease_expires"]:
+        return True
+    return datetime.datetime.fromisoformat(subscription["lease_expires"]) < now + WEBSUB_RENEW_BEFORE
+
+
+def subscribe_websub(hub: str, topic: str, callback: str, secret: str):
+    """
+    Ask the hub to push the content of the topic to the callback URL, signed with the secret.
+
+    The hub confirms the subscription asynchronously, by calling back the `WebSubReceiver`.
+    """
+    response = get_session().post(
+        hub,
+        data={
+            "hub.mode": "subscribe",
+            "hub.topic": topic,
+            "hub.callback": callback,
+            "hub.secret": secret,
+            "hub.lease_seconds": str(int(WEBSUB_LEASE.total_seconds())),
+        },
+        timeout=fetch_timeout,
+    )
+    response.raise_for_status()
+
+
+# hashes a hub may sign pushed content with, in X-Hub-Signature.
+WEBSUB_SIGNATURE_METHODS = {"sha1", "sha256", "sha384", "sha512"}
+
+
+def is_valid_websub_signature(secret: Optional[str], signature: Optional[str], body: bytes) -> bool:
+    if not secret or not signature:
+        return False
+    method, _, digest = signature.partition("=")
+    if method not in WEBSUB_SIGNATURE_METHODS:
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, method).hexdigest()
+    return hmac.compare_digest(expected, digest.lower())
+
+
+class WebSubReceiver:
+    """
+    Handle the callbacks of WebSub hubs: verifying subscription requests,
+    and merging pushed content into the cached body of the feed, from which it's rendered
+    just as if the feed had been polled.
+
+    Each subscription has its own callback URL, ending in a random key that only the hub is told.
+    See `serve_websub` for the HTTP server.
+    """
+
+    def __init__(self, cache: Cache, max_bytes: Optional[int] = None, on_receive: Optional[Callable[[], None]] = None):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        # called after content is merged, such as to wake up `--serve` to render it.
+        self.on_receive = on_receive
+        # pushes to the same feed are merged one at a time.
+        self.lock = threading.Lock()
+
+    def verify(self, callback_key: str, query: dict[str, str], now: datetime.datetime) -> tuple[int, str]:
+        """Handle the hub confirming (or denying) a subscription, returning the status and body of the response."""
+        subscription = self.cache.get_websub_by_callback_key(callback_key)
+        if subscription is None or query.get("hub.topic") != subscription["topic"]:
+            return 404, ""
+
+        mode = query.get("hub.mode")
+        if mode == "subscribe":
+            # only a pending request is verified, and only once.
+            if not subscription["requested_at"] or "hub.challenge" not in query:
+                return 404, ""
+            try:
+                # no longer than requested, so that the feed is polled again if the hub goes quiet.
+                lease = min(datetime.timedelta(seconds=int(query["hub.lease_seconds"])), WEBSUB_LEASE)
+            except (KeyError, ValueError, OverflowError):
+                lease = WEBSUB_LEASE
+            logger.info("websub: subscribed to %s for %s", subscription["topic"], lease)
+            self.cache.put_websub_lease(subscription["url"], now + lease)
+            return 200, query["hub.challenge"]
+        elif mode == "denied":
+            logger.warning("websub: hub denied subscription to %s: %s", subscription["topic"], query.get("hub.reason"))
+            self.cache.put_websub_lease(subscription["url"], None)
+            return 200, ""
+        else:
+            # nothing is ever unsubscribed.
+            return 404, ""
+
+    def receive(self, callback_key: str, content_type: Optional[str], signature: Optional[str], body: bytes) -> int:
+        """Handle the hub pushing new content, returning the status of the response."""
+        subscription = self.cache.get_websub_by_callback_key(callback_key)
+        if subscription is None:
+            # tells the hub to drop the subscription.
+            return 410
+
+        if self.max_bytes is not None and len(body) > self.max_bytes:
+            return 413
+
+        if not is_valid_websub_signature(subscription["secret"], signature, body):
+            # the content must be ignored, but acknowledged anyway, so a forger learns nothing.
+            logger.warning("websub: ignoring content with a bad signature for %s", subscription["topic"])
+            return 202
+
+        logger.info("websub: received %d bytes for %s", len(body), subscription["topic"])
+        with self.lock:
+            cached = self.cache.get_response(subscription["url"])
+            if cached is None:
+                self.cache.put_response(subscription["url"], None, None, content_type, body)
+            else:
+                # keep the validators, so that polling the feed later still revalidates
+                # (and keeps the merged body) rather than downloading it again.
+                self.cache.put_response(
+                    subscription["url"],
+                    cached["etag"],
+                    cached["last_modified"],
+                    cached["content_type"],
+                    merge_feed_entries(cached["body"], body),
+                    capped=bool(cached["capped"]),
+                    location=cached["location"],
+                )
+        if self.on_receive:
+            self.on_receive()
+        return 202
+
+
+def serve_websub(receiver: WebSubReceiver, address: tuple[str, int]):
+    """Create an HTTP server, not yet started, that passes WebSub callbacks to the given receiver."""
+    import http.server
+
+    class WebSubHandler(http.server.BaseHTTPRequestHandler):
+        def get_callback_key(self) -> str:
+            return urllib.parse.urlsplit(self.path).path.rstrip("/").rpartition("/")[2]
+
+        def respond(self, status: int, body: bytes = b""):
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+            status, body = receiver.verify(self.get_callback_key(), query, datetime.datetime.now(datetime.timezone.utc))
+            self.respond(status, body.encode("utf-8"))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if receiver.max_bytes is not None and length > receiver.max_bytes:
+                self.respond(413)
+                return
+            body = self.rfile.read(length)
+            self.respond(receiver.receive(
+                self.get_callback_key(),
+                self.headers.get("Content-Type"),
+                self.headers.get("X-Hub-Signature"),
+                body,
+            ))
+
+        def log_message(self, format, *args):
+            logger.debug("websub: " + format, *args)
+
+    return http.server.ThreadingHTTPServer(address, WebSubHandler)
 
 
 def parse_opml(opml_path):
     """Parse OPML file directly to extract feeds with all necessary information"""
+    import xml.etree.ElementTree as ET
+
     tree = ET.parse(opml_path)
     root = tree.getroot()
     
@@ -220,8 +1818,109 @@ def parse_opml(opml_path):
     return feeds
 
 
-# Parse OPML file completely with direct XML parsing
-opml_feeds = parse_opml(Path(sys.argv[1]))
+# number of releases to fetch per repository, as many as the releases Atom feed lists.
+GITHUB_RELEASES_PER_REPO = 10
+
+
+def parse_github_timestamp(ts: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def build_releases_query(repositories: list[str]) -> str:
+    """Build a GraphQL query to fetch the recent releases of multiple repositories at once"""
+    variables_parts = []
+    query_body_parts = []
+
+    for i, _ in enumerate(repositories):
+        alias = f"repo{i}"
+
+        variables_parts.extend([
+            f"${alias}Owner: String!",
+            f"${alias}Name: String!"
+        ])
+
+        query_body_parts.append(f"""
+        {alias}: repository(owner: ${alias}Owner, name: ${alias}Name) {{
+          releases(first: {GITHUB_RELEASES_PER_REPO}, orderBy: {{field: CREATED_AT, direction: DESC}}) {{
+            nodes {{
+              id
+              name
+              tagName
+              url
+              isDraft
+              createdAt
+              publishedAt
+              descriptionHTML
+            }}
+          }}
+        }}""")
+
+    return "".join([
+        "query(",
+        ", ".join(variables_parts),
+        ") {",
+        *query_body_parts,
+        """
+      rateLimit {
+        remaining
+        limit
+      }
+    }""",
+    ])
+
+
+def build_releases_variables(repositories: list[str]) -> dict[str, str]:
+    """Build variables for the batch GraphQL query"""
+    variables = {}
+
+    for i, repo in enumerate(repositories):
+        owner, name = repo.split("/", 1)
+        alias = f"repo{i}"
+        variables[f"{alias}Owner"] = owner
+        variables[f"{alias}Name"] = name
+
+    return variables
+
+
+def fetch_github_releases(token: str, repositories: list[str]) -> dict[str, list[dict]]:
+    """
+    Fetch the recent releases of multiple repositories in a single GraphQL query,
+    rather than one releases Atom feed per repository.
+
+    Returns the releases by repository ("owner/name"), omitting repositories that couldn't be found.
+    Raises when the request fails as a whole.
+    """
+    if not repositories:
+        return {}
+
+    response = get_session().post(
+        "https://api.github.com/graphql",
+        json={"query": build_releases_query(repositories), "variables": build_releases_variables(repositories)},
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=fetch_timeout,
+    )
+    response.raise_for_status()
+
+    remaining = response.headers.get("x-ratelimit-remaining")
+    limit = response.headers.get("x-ratelimit-limit")
+    if remaining and limit:
+        logger.debug("GraphQL rate limit: %s/%s points remaining", remaining, limit)
+
+    data = response.json()
+    if not data.get("data"):
+        raise ValueError(f"GraphQL errors: {data.get('errors')}")
+
+    results = {}
+    for i, repository in enumerate(repositories):
+        repo_data = data["data"].get(f"repo{i}")
+        if not repo_data:
+            # such as a repository that was renamed or made private since it was starred.
+            logger.warning("repository %s not found or inaccessible", repository)
+            continue
+
+        results[repository] = repo_data["releases"]["nodes"]
+
+    return results
 
 
 @dataclass
@@ -231,6 +1930,10 @@ class Entry:
     link: str
     content: str
     feed: "Feed"
+    # see `get_entry_keys`.
+    keys: list[str] = field(default_factory=list, repr=False, compare=False)
+    # (feed title, link) of the same entry in other feeds, which were dropped in favor of this one.
+    duplicates: list[tuple[str, str]] = field(default_factory=list, repr=False, compare=False)
 
 
 @dataclass
@@ -242,6 +1945,15 @@ class Feed:
     # link to project/homepage/base, not the feed
     homepage: Optional[str] = None
 
+    stats: FeedStats = field(default_factory=FeedStats, repr=False, compare=False)
+
+    # for "release" feeds: the releases of the repository, when fetched up front via GraphQL,
+    # in which case the Atom feed at `url` isn't downloaded.
+    releases: Optional[list[dict]] = field(default=None, repr=False, compare=False)
+
+    # remembers the timestamp format of the feed, across its entries and fetches.
+    timestamps: TimestampParser = field(default_factory=TimestampParser, repr=False, compare=False)
+
     @classmethod
     def from_mastodon(cls, handle):
         assert handle[0] == "@"
@@ -257,142 +1969,244 @@ class Feed:
             title=handle
         )
 
-    def fetch(self) -> Iterator[Entry]:
+    def download(self) -> tuple[bytes, dict[str, str]]:
         logger.debug("fetching feed: %s", self.title)
+        return fetch_url(self.url, get_request_headers(self.url), timeout=fetch_timeout, stats=self.stats, max_bytes=max_feed_bytes)
+
+    def convert(self, entry_id: str, timestamp: datetime.datetime, kind: str, value: str) -> tuple[str, str]:
+        """
+        Convert the raw content of the given entry via `convert_content`,
+        reusing the result from a previous run when the content hasn't changed.
+        """
+        started = time.perf_counter()
+        try:
+            if not cache:
+                self.stats.converted_entries += 1
+                first_line, content_html, sanitized_bytes = run_conversion(kind, value)
+                self.stats.sanitized_bytes += sanitized_bytes
+                return first_line, content_html
+
+            content_hash = hash_content(kind, value)
+
+            cached = cache.get_content(self.url, entry_id, content_hash)
+            if cached is not None:
+                self.stats.sanitized_bytes += cached["sanitized_bytes"]
+                return cached["first_line"], cached["html"]
+
+            self.stats.converted_entries += 1
+            first_line, content_html, sanitized_bytes = run_conversion(kind, value)
+            self.stats.sanitized_bytes += sanitized_bytes
+            cache.put_content(self.url, entry_id, content_hash, timestamp, first_line, content_html, sanitized_bytes)
+            return first_line, content_html
+        finally:
+            self.stats.convert_seconds += time.perf_counter() - started
+
+    def is_filtered(self, title: Optional[str], link: Optional[str], author: Optional[str] = None) -> bool:
+        """should the entry be dropped, per the filter rules? counts the entries each rule drops."""
+        for rule in filter_rules:
+            if rule.matches(self, title, link, author):
+                self.stats.filtered_entries[rule.name] = self.stats.filtered_entries.get(rule.name, 0) + 1
+                return True
+        return False
+
+    def parse(
+        self,
+        body: bytes,
+        response_headers: dict[str, str],
+        now: datetime.datetime,
+        index: Optional[EntryIndex] = None,
+    ) -> Iterator[Entry]:
+        """
+        Yield the recent entries of the feed body, as of `now`,
+        except those claimed by other feeds in the `index`.
+
+        Many servers ignore conditional requests and send the same body again,
+        so when the body is the same as the last one parsed, its entries are reused
+        rather than parsed, filtered, and converted again.
+        """
+        if not cache:
+            yield from self.parse_body(body, response_headers, now, index)
+            return
+
+        body_hash = hash_body(body, hash_rules(filter_rules))
+        parsed = cache.get_parsed(self.url, body_hash)
+        if parsed is not None:
+            logger.debug("feed unchanged, reusing entries: %s", self.title)
+            self.stats.reused = True
+
+            stats = json.loads(parsed["stats"])
+            self.stats.total_entries = stats["total_entries"]
+            self.stats.recent_entries = stats["recent_entries"]
+            self.stats.newest_entry = datetime.datetime.fromisoformat(stats["newest_entry"]) if stats["newest_entry"] else None
+            self.stats.interval_seconds = stats["interval_seconds"]
+            self.stats.sanitized_bytes = stats["sanitized_bytes"]
+            # rows written before filter rules were counted don't have these.
+            self.stats.filtered_entries = dict(stats.get("filtered_entries", {}))
+
+            for entry in json.loads(parsed["entries"]):
+                timestamp = datetime.datetime.fromisoformat(entry["timestamp"])
+                # the window has moved on since.
+                if not is_within_window(timestamp, now):
+                    continue
+
+                keys = entry.get("keys") or get_entry_keys(entry["link"], entry["title"])
+                if index and not index.claim(self, entry["link"], keys):
+                    continue
+
+                yield Entry(
+                    timestamp=timestamp,
+                    title=entry["title"],
+                    link=entry["link"],
+                    content=entry["content"],
+                    feed=self,
+                    keys=keys,
+                )
+            return
+
+        entries = list(self.parse_body(body, response_headers, now, index))
+
+        # entries in the future may come into the window later, when they'd be missed,
+        # and a failed parse should be retried.
+        # entries dropped as duplicates weren't converted, and the other feed may not have them next time.
+        if not self.stats.error and not self.stats.future_entries and not self.stats.duplicate_entries:
+            cache.put_parsed(
+                self.url,
+                body_hash,
+                {
+                    "total_entries": self.stats.total_entries,
+                    "recent_entries": self.stats.recent_entries,
+                    "newest_entry": self.stats.newest_entry.isoformat() if self.stats.newest_entry else None,
+                    "interval_seconds": self.stats.interval_seconds,
+                    "sanitized_bytes": self.stats.sanitized_bytes,
+                    "filtered_entries": self.stats.filtered_entries,
+                },
+                [
+                    {
+                        "timestamp": entry.timestamp.isoformat(),
+                        "title": entry.title,
+                        "link": entry.link,
+                        "content": entry.content,
+                        "keys": entry.keys,
+                    }
+                    for entry in entries
+                ],
+            )
+
+        yield from entries
+
+    def parse_body(
+        self,
+        body: bytes,
+        response_headers: dict[str, str],
+        now: datetime.datetime,
+        index: Optional[EntryIndex] = None,
+    ) -> Iterator[Entry]:
+        """
+        Parse the feed body and yield its recent entries, as of `now`.
+
+        Entries are filtered by timestamp and title before their content is converted,
+        since conversion is by far the most expensive step and most entries
+        in a feed are too old to be shown.
+
+        For the same reason, entries past the first few that are older than the window
+        aren't even parsed; see `truncate_feed`.
+        """
+        import feedparser
+
+        truncated = truncate_feed(body, now, incomplete=self.stats.capped, timestamps=self.timestamps)
+        self.stats.truncated_bytes = len(body) - len(truncated)
 
         try:
-            # Use proper User-Agent headers, especially important for Reddit feeds
-            if 'reddit.com' in self.url.lower():
-                import requests
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                response = requests.get(self.url, headers=headers, timeout=30)
-                response.raise_for_status()
-                d = feedparser.parse(response.text)
-            else:
-                d = feedparser.parse(self.url)
+            d = feedparser.parse(truncated, response_headers=response_headers)
         except Exception as e:
-            logger.error("failed to fetch feed %s: %s", self.title, e, exc_info=True)
+            logger.error("failed to parse feed %s: %s", self.title, e, exc_info=True)
+            self.stats.error = f"parse: {e}"
             return
 
         # Check for feed parsing errors
         if hasattr(d, 'bozo') and d.bozo and hasattr(d, 'bozo_exception'):
             logger.error("failed to parse feed %s: %s", self.title, d.bozo_exception)
+
+        hub, topic = get_websub_links(d)
+        if hub and cache:
+            cache.put_websub_hub(self.url, hub, topic or self.url)
             
         # Track entries for logging
         total_entries = len(d.entries)
         entries_in_period = 0
-        now = datetime.datetime.now()
-        three_days_ago = (now - datetime.timedelta(days=RECENT_DAYS)).date()
+        # timestamps of all entries, recent or not, to learn how often the feed posts.
+        timestamps = []
 
         for entry in d.entries:
 
             if self.category == "rss" or self.category == "release":
                 # github releases Atom feed
 
-                if hasattr(entry, "content"):
-                    for content in entry.content:
-                        if content.type in ("text/html", "application/xhtml+xml"):
-
-                            # danger: injection
-                            # content_html = html.unescape(content.value)
-                            
-                            # Remove anchor links from headings before processing
-                            cleaned_content = remove_heading_links(content.value)
-
-                            content_md = html2text.html2text(cleaned_content)
-                            # Re-escape HTML tags that appear as text examples (e.g., <table>)
-                            content_md = escape_html_tags_in_markdown(content_md)
-                            content_html = markdown.markdown(content_md)
-                            
-                            # Clean up any remaining malformed markdown links in headings
-                            content_html = clean_markdown_links_from_headings(content_html)
-                            
-                            # Fix any headings that got broken across elements
-                            content_html = fix_broken_heading_elements(content_html)
-
-                        elif content.type == "text/plain":
-                            content_html = markdown.markdown(content.value)
-
-                        else:
-                            raise ValueError("unexpected content type: " + content.type)
-
-                        # only yield one entry per entry
-                        break
-
-                elif hasattr(entry, "summary"):
-                    # Remove anchor links from headings in summary as well
-                    cleaned_summary = remove_heading_links(entry.summary)
-                    content_html = markdown.markdown(cleaned_summary)
-                    
-                    # Clean up any remaining malformed markdown links in headings
-                    content_html = clean_markdown_links_from_headings(content_html)
-                    
-                    # Fix any headings that got broken across elements
-                    content_html = fix_broken_heading_elements(content_html)
-
-                elif hasattr(entry, "title"):
-                    content_html = "<i>(empty)</i>"
-
-                else:
-                    logger.warning("post has no content")
-                    content_html = "<i>(empty)</i>"
-
-                ts = entry.published if "published" in entry else entry.updated
-                # handle:
-                #
-                #     dateutil.parser._parser.ParserError: hour must be in 0..23: Fri, 22 Nov 2024 24:00:00 GMT
-                #
-                # this is probably technically not correct, since it backdates the post by a day, but whatever.
-                ts = ts.replace(" 24:00:00", " 00:00:00")
-
-                entry_obj = Entry(
-                    timestamp=dateutil.parser.parse(ts),
+                timestamp = self.timestamps.parse_entry(entry)
+                timestamps.append(normalize_timestamp(timestamp))
+
+                if not is_within_window(timestamp, now):
+                    if not is_before_window(timestamp, now):
+                        self.stats.future_entries += 1
+                    continue
+
+                entries_in_period += 1
+
+                if self.is_filtered(entry.title, entry.link, entry.get("author")):
+                    continue
+
+                keys = get_entry_keys(entry.link, entry.title)
+                if index and not index.claim(self, entry.link, keys):
+                    continue
+
+                kind, value = get_raw_content(entry)
+                _, content_html = self.convert(entry.get("id") or entry.link, timestamp, kind, value)
+
+                yield Entry(
+                    timestamp=timestamp,
                     title=entry.title,
                     link=entry.link,
                     content=content_html,
                     feed=self,
+                    keys=keys,
                 )
-                
-                # Check if entry is within the 3-day period for logging
-                entry_date = entry_obj.timestamp.date() if entry_obj.timestamp.tzinfo is None else entry_obj.timestamp.astimezone().date()
-                if entry_date >= three_days_ago:
-                    entries_in_period += 1
-                
-                yield entry_obj
 
             elif self.category == "mastodon":
                 # mastodon post RSS feed
 
-                # Remove anchor links from headings before processing
-                cleaned_summary = remove_heading_links(entry.summary)
-                content_md = html2text.html2text(cleaned_summary)
-                # Re-escape HTML tags that appear as text examples (e.g., <table>)
-                content_md = escape_html_tags_in_markdown(content_md)
-                content_html = markdown.markdown(content_md)
-                
-                # Clean up any remaining malformed markdown links in headings
-                content_html = clean_markdown_links_from_headings(content_html)
-                
-                # Fix any headings that got broken across elements
-                content_html = fix_broken_heading_elements(content_html)
-            
-                entry_obj = Entry(
-                    timestamp=dateutil.parser.parse(entry.published if "published" in entry else entry.updated),
-                    # use first line of content
-                    title=content_md.partition("\n")[0],
+                timestamp = self.timestamps.parse_entry(entry)
+                timestamps.append(normalize_timestamp(timestamp))
+
+                if not is_within_window(timestamp, now):
+                    if not is_before_window(timestamp, now):
+                        self.stats.future_entries += 1
+                    continue
+
+                entries_in_period += 1
+
+                # the title isn't known until the post is converted, so rules on it are checked afterwards.
+                if self.is_filtered(None, entry.link, entry.get("author")):
+                    continue
+
+                # likewise, it's matched against the entries of other feeds by what it links to.
+                keys = get_entry_keys(entry.link, None, shared=entry.summary)
+                if index and not index.claim(self, entry.link, keys):
+                    continue
+
+                # use first line of content
+                title, content_html = self.convert(entry.get("id") or entry.link, timestamp, "html", entry.summary)
+
+                if self.is_filtered(title, entry.link, entry.get("author")):
+                    continue
+
+                yield Entry(
+                    timestamp=timestamp,
+                    title=title,
                     link=entry.link,
                     content=content_html,
                     feed=self,
+                    keys=keys,
                 )
-                
-                # Check if entry is within the 3-day period for logging
-                entry_date = entry_obj.timestamp.date() if entry_obj.timestamp.tzinfo is None else entry_obj.timestamp.astimezone().date()
-                if entry_date >= three_days_ago:
-                    entries_in_period += 1
-                
-                yield entry_obj
 
             else:
                 raise ValueError("unexpected category")
@@ -400,95 +2214,614 @@ class Feed:
         # Log feed statistics
         logger.info("feed %s: found %d total entries, %d entries in past %d days", 
                    self.title, total_entries, entries_in_period, RECENT_DAYS)
-        
-        # Track feeds with no entries for summary
-        if total_entries == 0 or entries_in_period == 0:
-            feeds_with_no_entries.append({
-                'title': self.title,
-                'total_entries': total_entries,
-                'recent_entries': entries_in_period,
-                'url': self.url
-            })
-
-
-feeds = [
-    Feed.from_mastodon("@malcat@infosec.exchange"),
-    Feed.from_mastodon("@pnx@infosec.exchange"),
-    Feed.from_mastodon("@HexRaysSA@infosec.exchange"),
-    Feed.from_mastodon("@binaryninja@infosec.exchange"),
-]
+
+        self.stats.total_entries = total_entries
+        self.stats.recent_entries = entries_in_period
+        self.record_timestamps(timestamps, now)
+
+    def parse_releases(self, releases: list[dict], now: datetime.datetime, index: Optional[EntryIndex] = None) -> Iterator[Entry]:
+        """
+        Yield the recent entries, as of `now`, from GitHub releases fetched via `fetch_github_releases`,
+        filtered and converted the same way as the entries of the releases Atom feed.
+        """
+        entries_in_period = 0
+        timestamps = []
+
+        for release in releases:
+            if release["isDraft"]:
+                continue
+
+            timestamp = parse_github_timestamp(release["publishedAt"] or release["createdAt"])
+            timestamps.append(timestamp)
+
+            if not is_within_window(timestamp, now):
+                continue
+
+            entries_in_period += 1
+
+            # the Atom feed uses the tag when the release isn't named.
+            title = release["name"] or release["tagName"]
+            if self.is_filtered(title, release["url"]):
+                continue
+
+            keys = get_entry_keys(release["url"], title)
+            if index and not index.claim(self, release["url"], keys):
+                continue
+
+            if release["descriptionHTML"]:
+                kind, value = "html", release["descriptionHTML"]
+            else:
+                kind, value = "empty", ""
+            _, content_html = self.convert(release["id"], timestamp, kind, value)
+
+            yield Entry(
+                timestamp=timestamp,
+                title=title,
+                link=release["url"],
+                content=content_html,
+                feed=self,
+                keys=keys,
+            )
+
+        logger.info("feed %s: found %d total releases, %d releases in past %d days",
+                   self.title, len(releases), entries_in_period, RECENT_DAYS)
+
+        self.stats.total_entries = len(releases)
+        self.stats.recent_entries = entries_in_period
+        self.record_timestamps(timestamps, now)
+
+    def record_timestamps(self, timestamps: list[datetime.datetime], now: datetime.datetime):
+        """Record how recently and how often the feed posts, given the timestamps of all its entries."""
+        import statistics
+
+        # ignore far-future posts, as the window does.
+        timestamps = sorted(ts for ts in timestamps if ts <= now + datetime.timedelta(hours=FUTURE_TOLERANCE_HOURS))
+        if timestamps:
+            self.stats.newest_entry = timestamps[-1]
+        if len(timestamps) > 1:
+            self.stats.interval_seconds = statistics.median(
+                (b - a).total_seconds() for a, b in itertools.pairwise(timestamps)
+            )
+
+
+# when feeds share an entry, it's kept from the feed whose category comes first:
+# feeds are followed on purpose, starred repositories less so, and Mastodon posts mostly share links to the others.
+CATEGORY_PRIORITY = ["rss", "release", "mastodon"]
+
+
+@dataclass
+class Claim:
+    """An entry, as claimed from `EntryIndex`, and the duplicates of it dropped in its favor."""
+    feed: Feed
+    priority: tuple[int, int]
+    link: str
+    keys: list[str]
+    duplicates: list[tuple[str, str]] = field(default_factory=list)
+
+
+class EntryIndex:
+    """
+    The entries of all the feeds in a run, keyed by `get_entry_keys`, to drop entries
+    that more than one feed has, before they're converted.
+
+    Feeds claim each entry before converting it. An entry that a feed of higher priority
+    (per `CATEGORY_PRIORITY`, then the order of the feeds) has already claimed is dropped.
+    Since feeds are parsed concurrently, a feed of higher priority may also claim an entry later,
+    superseding the earlier claim, whose entry is then dropped by `resolve`.
+    """
+
+    def __init__(self, feeds: list[Feed]):
+        # keyed by the identity of each feed rather than its URL,
+        # since the same URL may be listed twice, such as in the OPML file and as a starred repository.
+        self.priorities = {
+            id(feed): (CATEGORY_PRIORITY.index(feed.category) if feed.category in CATEGORY_PRIORITY else len(CATEGORY_PRIORITY), i)
+            for i, feed in enumerate(feeds)
+        }
+        self.claims: dict[str, Claim] = {}
+        # (feed identity, link) of each claimed entry.
+        self.entries: dict[tuple[int, str], Claim] = {}
+        self.superseded: set[tuple[int, str]] = set()
+        self.lock = threading.Lock()
+
+    def claim(self, feed: Feed, link: str, keys: list[str]) -> bool:
+        """Claim the entry of the given feed, returning False when it's a duplicate to drop."""
+        priority = self.priorities.get(id(feed), (len(CATEGORY_PRIORITY) + 1, len(self.priorities)))
+        with self.lock:
+            # entries repeated within a feed are left alone.
+            owners = list({
+                id(claim): claim
+                for key in keys
+                if (claim := self.claims.get(key)) is not None and claim.feed is not feed
+            }.values())
+
+            higher = [owner for owner in owners if owner.priority < priority]
+            if higher:
+                owner = min(higher, key=lambda owner: owner.priority)
+                logger.debug("dropping duplicate entry %s from %s, already in %s", link, feed.title, owner.feed.title)
+                owner.duplicates.append((feed.title, link))
+                feed.stats.duplicate_entries += 1
+                return False
+
+            claim = Claim(feed, priority, link, list(keys))
+            for owner in owners:
+                logger.debug("dropping duplicate entry %s from %s, also in %s", owner.link, owner.feed.title, feed.title)
+                self.superseded.add((id(owner.feed), owner.link))
+                owner.feed.stats.duplicate_entries += 1
+                claim.duplicates.append((owner.feed.title, owner.link))
+                claim.duplicates.extend(owner.duplicates)
+                claim.keys.extend(key for key in owner.keys if key not in claim.keys)
+
+            for key in claim.keys:
+                self.claims[key] = claim
+            self.entries[(id(feed), link)] = claim
+            return True
+
+    def resolve(self, entries: list[Entry]) -> list[Entry]:
+        """Drop the entries whose claims were superseded, and record the duplicates of the rest."""
+        kept = []
+        for entry in entries:
+            if (id(entry.feed), entry.link) in self.superseded:
+                continue
+            claim = self.entries.get((id(entry.feed), entry.link))
+            if claim is not None:
+                entry.duplicates = list(claim.duplicates)
+            kept.append(entry)
+        return kept
+
+
+def run_in_thread(fn: Callable[[], T]) -> "asyncio.Future[T]":
+    """
+    Run the function on a new daemon thread and return a future for its result.
+
+    Unlike an executor, a daemon thread doesn't block interpreter exit,
+    so a request that is still hanging at the run deadline can simply be abandoned.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, exception):
+        if future.done():
+            # cancelled at the deadline; nobody is waiting for the result anymore.
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def target():
+        result, exception = None, None
+        try:
+            result = fn()
+        except Exception as e:
+            exception = e
+
+        try:
+            loop.call_soon_threadsafe(resolve, result, exception)
+        except RuntimeError:
+            # the event loop already closed, because the run deadline passed.
+            pass
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+def timed_parse(feed: Feed, parse: Callable[[], Iterator[Entry]]) -> list[Entry]:
+    started = time.perf_counter()
+    entries = list(parse())
+    # conversion is timed separately, as it happens while parsing.
+    feed.stats.parse_seconds = time.perf_counter() - started - feed.stats.convert_seconds
+    feed.stats.rendered_entries = len(entries)
+    return entries
+
+
+async def fetch_feed(
+    feed: Feed,
+    now: datetime.datetime,
+    limit: asyncio.Semaphore,
+    host_limit: asyncio.Semaphore,
+    skip: bool = False,
+    index: Optional[EntryIndex] = None,
+) -> list[Entry]:
+    if feed.releases is not None:
+        # fetched up front, along with the releases of the other repositories; see `refresh_github_releases`.
+        feed.stats.skipped = skip
+        return await parse_feed(feed, lambda: feed.parse_releases(feed.releases, now, index))
+
+    if skip:
+        # not due to be polled (or pushed to by its hub), so render the entries from the last fetch,
+        # which are still recent enough to show.
+        logger.debug("skipping fetch of feed: %s", feed.title)
+        feed.stats.skipped = True
+        cached = cache.get_response(feed.url)
+        if cached is None:
+            # the feed has been failing, so there's nothing to render.
+            feed.stats.error = "skipped: backing off after failures"
+            return []
+        feed.stats.bytes = len(cached["body"])
+        feed.stats.capped = bool(cached["capped"])
+        body, response_headers = cached["body"], get_response_headers(cached["location"] or feed.url, cached["content_type"])
+    else:
+        # only the network request counts against the concurrency limits;
+        # parsing happens afterwards so that a slow host doesn't hold a slot.
+        # the host's slot is taken first, so that feeds queued behind a busy host
+        # don't sit on global slots that feeds of other hosts could use.
+        async with host_limit, limit:
+            try:
+                body, response_headers = await run_in_thread(feed.download)
+            except Exception as e:
+                logger.error("failed to fetch feed %s: %s", feed.title, e, exc_info=True)
+                feed.stats.error = f"fetch: {e}"
+                return []
+
+    return await parse_feed(feed, lambda: feed.parse(body, response_headers, now, index))
+
+
+async def parse_feed(feed: Feed, parse: Callable[[], Iterator[Entry]]) -> list[Entry]:
+    # one malformed feed (say, a date that can't be parsed) shouldn't take down the other feeds,
+    # or the --serve loop with them.
+    try:
+        return await run_in_thread(lambda: timed_parse(feed, parse))
+    except Exception as e:
+        logger.error("failed to parse feed %s: %s", feed.title, e, exc_info=True)
+        feed.stats.error = f"parse: {e}"
+        return []
+
+
+async def fetch_feeds(
+    feeds: list[Feed],
+    now: datetime.datetime,
+    max_concurrency: int,
+    max_per_host: int,
+    deadline: Optional[float] = None,
+    skip: frozenset[str] = frozenset(),
+) -> tuple[list[Entry], list[Feed]]:
+    """
+    Fetch and parse all the given feeds concurrently, keeping the entries that are recent as of `now`.
+
+    At most `max_concurrency` requests are in flight at once, and at most `max_per_host`
+    to any single host, since many feeds share a host (github.com, infosec.exchange)
+    and those hosts throttle bursts of requests.
+
+    When `deadline` (per `time.monotonic()`) passes, feeds that haven't finished
+    are abandoned. Returns the entries that did arrive, and the feeds that timed out.
+
+    Feeds whose URL is in `skip` aren't fetched, but parsed from their cached body.
+
+    Entries that more than one feed has are only converted and returned once, see `EntryIndex`.
+    """
+    import asyncio
+
+    index = EntryIndex(feeds)
+
+    limit = asyncio.Semaphore(max_concurrency)
+    host_limits: dict[str, asyncio.Semaphore] = collections.defaultdict(lambda: asyncio.Semaphore(max_per_host))
+
+    tasks = {
+        asyncio.create_task(fetch_feed(
+            feed,
+            now,
+            limit,
+            host_limits[urllib.parse.urlsplit(feed.url).hostname or ""],
+            skip=feed.url in skip,
+            index=index,
+        )): feed
+        for feed in feeds
+    }
+
+    timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.wait(pending)
+
+    entries = index.resolve(list(itertools.chain.from_iterable(task.result() for task in done)))
+    duplicates = sum(len(entry.duplicates) for entry in entries)
+    if duplicates:
+        logger.info("dropped %d entries that were also in other feeds", duplicates)
+    timed_out = [tasks[task] for task in pending]
+    for feed in timed_out:
+        logger.warning("feed timed out: %s", feed.title)
+        feed.stats.timed_out = True
+
+    return entries, timed_out
+
+
+# loads the content of an entry, written with `write_entry_fragment`, when its <details> is first opened.
+LAZY_CONTENT_SCRIPT = """
+<script>
+  document.querySelectorAll("ol.feed li.entry details").forEach((details) => {
+    details.addEventListener("toggle", () => {
+      const content = details.querySelector("div.content[data-src]");
+      if (!details.open || !content) {
+        return;
+      }
+
+      const src = content.dataset.src;
+      delete content.dataset.src;
+      fetch(src)
+        .then((response) => {
+          if (!response.ok) {
+            throw new Error(response.statusText);
+          }
+          return response.text();
+        })
+        .then((html) => {
+          content.innerHTML = html;
+        })
+        .catch(() => {
+          // try again next time it's opened; the link still works meanwhile.
+          content.dataset.src = src;
+        });
+    });
+  });
+</script>
+"""
+
+
+def write_entry_fragment(directory: Path, content: str) -> str:
+    """
+    Write the content of an entry to a file named by its hash, returning the name.
+
+    Since the name changes whenever the content does, the files can be cached forever,
+    and files from previous runs with the same content are reused as is.
+    """
+    data = content.encode("utf-8")
+    name = hashlib.sha256(data).hexdigest()[:20] + ".html"
+
+    path = directory / name
+    if not path.exists():
+        directory.mkdir(parents=True, exist_ok=True)
+        # write then rename, so that a fragment is never served half-written.
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    return name
+
+
+def prune_entry_fragments(directory: Path, keep: set[str]) -> int:
+    """Remove entry fragments that aren't referenced anymore, returning the number removed."""
+    removed = 0
+    for path in directory.glob("*.html"):
+        if path.name not in keep:
+            path.unlink()
+            removed += 1
+    return removed
 
 
-for feed in opml_feeds:
-    feeds.append(
-        Feed(
-            category="rss",
-            title=feed["title"],
-            url=feed["url"],
-            homepage=feed["homepage"],
+def budget_entries(entries: list[Entry], entry_budget: Optional[int], total_budget: Optional[int]) -> dict[int, str]:
+    """
+    Pick the content to render for each entry, by `id(entry)`, within the given budgets in bytes.
+
+    Each entry is first shortened to `entry_budget`. Then, while the total is over `total_budget`,
+    entries are shortened further, oldest day first: first to `EXCERPT_MIN_BYTES`,
+    and then, if that's still not enough, to just a link to the entry.
+    """
+    contents = {
+        id(entry): excerpt_html(entry.content, entry_budget, entry.link) if entry_budget else entry.content
+        for entry in entries
+    }
+    if not total_budget:
+        return contents
+
+    def total() -> int:
+        return sum(len(content.encode("utf-8")) for content in contents.values())
+
+    days = [
+        list(day_entries)
+        for _, day_entries in itertools.groupby(
+            sorted(entries, key=lambda entry: normalize_timestamp(entry.timestamp)),
+            lambda entry: normalize_timestamp(entry.timestamp).date(),
         )
+    ]
+    for budget in (EXCERPT_MIN_BYTES, 0):
+        for day_entries in days:
+            if total() <= total_budget:
+                return contents
+
+            for entry in day_entries:
+                contents[id(entry)] = excerpt_html(entry.content, budget, entry.link)
+
+    return contents
+
+
+def record_health(feed: Feed, now: datetime.datetime, min_delay: datetime.timedelta = datetime.timedelta(0)):
+    """
+    Update the polling history of the given feed after fetching it, and schedule its next poll,
+    no sooner than `min_delay` from now.
+    """
+    health = cache.get_health(feed.url)
+
+    last_entry = feed.stats.newest_entry
+    interval_seconds = feed.stats.interval_seconds
+    if health is not None:
+        # keep what was learned before, when this fetch failed or the feed no longer lists older entries.
+        if health["last_entry"]:
+            previous = datetime.datetime.fromisoformat(health["last_entry"])
+            last_entry = max(last_entry, previous) if last_entry else previous
+        if interval_seconds is None:
+            interval_seconds = health["interval_seconds"]
+
+    if feed.stats.error or feed.stats.timed_out:
+        failures = (health["failures"] if health is not None else 0) + 1
+    else:
+        failures = 0
+
+    next_poll = now + max(get_poll_delay(now, last_entry, interval_seconds, failures), min_delay)
+    cache.put_health(feed.url, now, next_poll, last_entry, interval_seconds, failures)
+
+
+def poll_feeds(
+    feeds: list[Feed],
+    now: datetime.datetime,
+    max_concurrency: int,
+    max_per_host: int,
+    deadline: Optional[float] = None,
+    poll_all: bool = False,
+    min_poll_delay: datetime.timedelta = datetime.timedelta(0),
+    poll_slack: datetime.timedelta = POLL_SLACK,
+) -> tuple[list[Entry], list[Feed]]:
+    """
+    Fetch the feeds that are due to be polled, and parse the others from the cache, via `fetch_feeds`.
+    Then schedule the next poll of each fetched feed, and evict what won't be shown again.
+    """
+    import asyncio
+
+    # feeds that aren't due are rendered from the cached body, which only exists with --cache.
+    if cache and not poll_all:
+        # as are feeds whose hub pushes their new content into the cached body.
+        for feed in feeds:
+            feed.stats.subscribed = is_subscribed(cache.get_websub(feed.url), now)
+        skip = frozenset(
+            feed.url for feed in feeds
+            if feed.stats.subscribed or not is_due(cache.get_health(feed.url), now, poll_slack)
+        )
+    else:
+        skip = frozenset()
+
+    entries, timed_out = asyncio.run(fetch_feeds(
+        feeds,
+        now,
+        max_concurrency,
+        max_per_host,
+        deadline=deadline,
+        skip=skip,
+    ))
+
+    filtered = collections.Counter()
+    for feed in feeds:
+        filtered.update(feed.stats.filtered_entries)
+    for rule in filter_rules:
+        logger.info("filter rule %s dropped %d entries", rule.name, filtered[rule.name])
+
+    if cache:
+        for feed in feeds:
+            if not feed.stats.skipped:
+                record_health(feed, now, min_poll_delay)
+
+        # entries before the window will never be shown again, so their content can go.
+        evicted = cache.evict_content(now - datetime.timedelta(days=RECENT_DAYS + 1))
+        logger.debug("evicted %d converted entries from the cache", evicted)
+        evicted = cache.evict_parsed(now - datetime.timedelta(days=RECENT_DAYS + 1))
+        logger.debug("evicted %d parsed feeds from the cache", evicted)
+
+    return entries, timed_out
+
+
+def get_serve_delay(feeds: list[Feed], now: datetime.datetime) -> datetime.timedelta:
+    """How long `--serve` can sleep before the next feed is due to be polled, or the window moves on."""
+    next_wake = now + SERVE_MAX_SLEEP
+    for feed in feeds:
+        # pushes wake it up instead.
+        if is_subscribed(cache.get_websub(feed.url), now):
+            continue
+        health = cache.get_health(feed.url)
+        if health is not None:
+            next_wake = min(next_wake, datetime.datetime.fromisoformat(health["next_poll"]))
+    return max(next_wake - now, SERVE_MIN_SLEEP)
+
+
+def get_entries_key(entries: list[Entry]) -> frozenset:
+    """Identify the set of visible entries, so that the output is only rewritten when it changes."""
+    return frozenset(
+        (entry.feed.url, entry.link, entry.title, normalize_timestamp(entry.timestamp).isoformat(), entry.content)
+        for entry in entries
     )
 
 
-# take the 20 most recently updated repos
-try:
-    response = requests.get("https://api.github.com/users/williballenthin/starred?sort=updated&direction=desc&per_page=20")
-    if response.status_code == 200:
-        repos = response.json()
-        
-        for repo in repos:
-            title = repo["full_name"]
-            logger.debug("found repo: %s", title)
-
-            homepage = f"https://github.com/{title}"
-            url = homepage + "/releases.atom"
-            feeds.append(
-                Feed("release", url, homepage=homepage, title=title)
+def write_atomically(path: Path, text: str):
+    """Write the file via a temporary file alongside it, so that readers never see it half-written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_text(text, encoding="utf-8")
+    os.replace(temporary, path)
+
+
+def renew_websub_subscriptions(feeds: list[Feed], callback: str, now: datetime.datetime) -> int:
+    """
+    Ask the hubs of the given feeds, for those that advertise one, to start or renew
+    pushing their content to `callback`, returning the number of requests made.
+    """
+    requested = 0
+    for feed in feeds:
+        subscription = cache.get_websub(feed.url)
+        if subscription is None or not needs_websub_request(subscription, now):
+            continue
+
+        if is_subscribed(subscription, now) and subscription["callback_key"]:
+            # renewing a live subscription keeps its callback and secret,
+            # which the hub keeps pushing to, and signing with, until it verifies the renewal.
+            callback_key, secret = subscription["callback_key"], subscription["secret"]
+        else:
+            callback_key, secret = os.urandom(16).hex(), os.urandom(16).hex()
+        try:
+            subscribe_websub(
+                subscription["hub"],
+                subscription["topic"],
+                callback.rstrip("/") + "/" + callback_key,
+                secret,
             )
-    else:
-        logger.warning("failed to fetch GitHub starred repos: HTTP %d", response.status_code)
-except Exception as e:
-    logger.warning("failed to fetch GitHub starred repos: %s", e, exc_info=True)
-
-# TODO
-# feeds = feeds[:3]
-
-entries = []
-with concurrent.futures.ThreadPoolExecutor(max_workers=32) as executor:
-    def doit(feed):
-        return list(feed.fetch())
-
-    futures = [executor.submit(doit, feed) for feed in feeds]
-    for future in concurrent.futures.as_completed(futures):
-        entries.extend(future.result())
-
-# this nightly release is updated every day
-# ghostty-org/ghostty
-entries = [e for e in entries 
-           if "Ghostty Tip" not in e.title
-           and e.title != "nightly"]
-
-# only show entries within the past few days, and avoid far-future posts
-snapshot_time = datetime.datetime.now(datetime.timezone.utc)
-three_days_ago = (snapshot_time - datetime.timedelta(days=RECENT_DAYS)).date()
-future_cutoff = snapshot_time + datetime.timedelta(hours=FUTURE_TOLERANCE_HOURS)
-entries = [
-    entry for entry in entries
-    if normalize_timestamp(entry.timestamp).date() >= three_days_ago
-    and normalize_timestamp(entry.timestamp) <= future_cutoff
-]
+        except Exception as e:
+            logger.warning("failed to subscribe to %s via %s: %s", feed.title, subscription["hub"], e)
+            continue
+
+        cache.put_websub_request(feed.url, callback_key, secret, now)
+        requested += 1
+    return requested
+
+
+def group_by_day(entries: list[Entry]) -> Iterator[tuple[datetime.date, list[Entry]]]:
+    """Group entries by day (UTC), newest first."""
+    entries = sorted(entries, key=lambda entry: normalize_timestamp(entry.timestamp), reverse=True)
+    for day, day_entries in itertools.groupby(entries, lambda entry: normalize_timestamp(entry.timestamp).date()):
+        yield day, list(day_entries)
+
+
+def write_html(
+    out: TextIO,
+    entries: list[Entry],
+    generated: datetime.datetime,
+    entry_budget: Optional[int] = None,
+    total_budget: Optional[int] = None,
+    entries_dir: Optional[Path] = None,
+    entries_url: Optional[str] = None,
+):
+    """
+    Write the entries as the HTML fragment included by the homepage, grouped by day.
+
+    With `entries_dir`, the content of each entry is written to its own file there,
+    served at `entries_url`, and loaded when the entry is opened.
+    """
+    # names of the entry fragments referenced by this run, when written to entries_dir.
+    fragments = set()
+
+    # content written to entry fragments doesn't count towards the size of the output.
+    contents = budget_entries(entries, entry_budget, None if entries_dir else total_budget)
 
-print("<ol class='feed'>")
-normalized_entries = [(normalize_timestamp(entry.timestamp), entry) for entry in entries]
-normalized_entries.sort(key=lambda pair: pair[0], reverse=True)
-for day, day_entries in itertools.groupby(normalized_entries, lambda pair: pair[0].date()):
-    print(f"""
+    print("<ol class='feed'>", file=out)
+    for day, day_entries in group_by_day(entries):
+        print(f"""
       <li><span class="date">{day.strftime("%B %d, %Y")}</span>
           <ol class="date-entries">
-    """)
+    """, file=out)
+
+        for entry in day_entries:
+            if entries_dir:
+                name = write_entry_fragment(entries_dir, contents[id(entry)])
+                fragments.add(name)
+                src = f"{entries_url.rstrip('/')}/{name}"
+                # replaced by the script below when the entry is opened.
+                content = f'<a href="{src}">show content</a>'
+                data_src = f' data-src="{src}"'
+            else:
+                content = contents[id(entry)]
+                data_src = ""
 
-    for _, entry in day_entries:
-        print(f"""
+            print(f"""
           <li class="entry">
               <details>
                  <summary>
@@ -498,32 +2831,472 @@ for day, day_entries in itertools.groupby(normalized_entries, lambda pair: pair[
                      <span class="category">{entry.feed.category}</span>
                  </summary>
 
-                 <div class="content">
-                     {entry.content}
+                 <div class="content"{data_src}>
+                     {content}
                  </div>
               </details>
           </li>
-        """)
+        """, file=out)
 
-    print("</ol>")
+        print("</ol>", file=out)
 
-print("</ol>")
-print(f"<p class='feed-metadata-generated'>generated: {snapshot_time.strftime('%B %d, %Y at %H:%M:%S')}</p>")
+    print("</ol>", file=out)
 
-# Summarize feeds with no entries
-if feeds_with_no_entries:
-    logger.info("=== FEEDS WITH NO ENTRIES SUMMARY ===")
-    no_total_entries = [f for f in feeds_with_no_entries if f['total_entries'] == 0]
-    no_recent_entries = [f for f in feeds_with_no_entries if f['total_entries'] > 0 and f['recent_entries'] == 0]
-    
-    if no_total_entries:
-        logger.info("Feeds with no total entries (%d):", len(no_total_entries))
-        for feed in no_total_entries:
-            logger.info("  - %s (%s)", feed['title'], feed['url'])
-    
-    if no_recent_entries:
-        logger.info("Feeds with no recent entries in past %d days (%d):", RECENT_DAYS, len(no_recent_entries))
-        for feed in no_recent_entries:
-            logger.info("  - %s (%d total entries) (%s)", feed['title'], feed['total_entries'], feed['url'])
-else:
-    logger.info("All feeds have recent entries")
+    if entries_dir:
+        print(LAZY_CONTENT_SCRIPT, file=out)
+        removed = prune_entry_fragments(entries_dir, fragments)
+        logger.debug("wrote %d entry fragments, removed %d", len(fragments), removed)
+
+    print(f"<p class='feed-metadata-generated'>generated: {generated.strftime('%B %d, %Y at %H:%M:%S')}</p>", file=out)
+
+
+def build_json_feed(entries: list[Entry], generated: datetime.datetime, entry_budget: Optional[int] = None) -> dict:
+    """
+    Build a JSON Feed (version 1.1) of the entries, newest first.
+
+    The day grouping and the feed each entry came from, which JSON Feed has no place for,
+    are under the `_static_rss` extension of the feed and of each item.
+    """
+    contents = budget_entries(entries, entry_budget, None)
+
+    items = []
+    days = []
+    for day, day_entries in group_by_day(entries):
+        days.append({
+            "date": day.isoformat(),
+            "items": [entry.link for entry in day_entries],
+        })
+
+        for entry in day_entries:
+            item = {
+                "id": entry.link,
+                "url": entry.link,
+                "title": entry.title,
+                "content_html": contents[id(entry)],
+                "date_published": normalize_timestamp(entry.timestamp).isoformat(),
+                "authors": [{"name": entry.feed.title, **({"url": entry.feed.homepage} if entry.feed.homepage else {})}],
+                "tags": [entry.feed.category],
+                "_static_rss": {
+                    "day": day.isoformat(),
+                    "feed": {
+                        "title": entry.feed.title,
+                        "url": entry.feed.url,
+                        "homepage": entry.feed.homepage,
+                        "category": entry.feed.category,
+                    },
+                    "duplicates": [{"feed": title, "url": link} for title, link in entry.duplicates],
+                },
+            }
+            items.append(item)
+
+    return {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": "Recent entries from followed feeds",
+        "items": items,
+        "_static_rss": {
+            "generated": generated.isoformat(),
+            "days": days,
+        },
+    }
+
+
+def write_report(path: Path, feeds: list[Feed], generated: datetime.datetime, duration: float):
+    """
+    Write the stats of each feed as JSON, slowest feeds first,
+    to find the feeds that dominate the runtime.
+    """
+    def to_json(value):
+        if isinstance(value, float):
+            return round(value, 3)
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return value
+
+    report = {
+        "generated": generated.isoformat(),
+        "duration_seconds": round(duration, 3),
+        "fetches_skipped": sum(1 for feed in feeds if feed.stats.skipped),
+        "feeds": [
+            {
+                "title": feed.title,
+                "url": feed.url,
+                "category": feed.category,
+                "total_seconds": round(feed.stats.total_seconds, 3),
+                **{
+                    key: to_json(value)
+                    for key, value in asdict(feed.stats).items()
+                },
+            }
+            for feed in sorted(feeds, key=lambda feed: feed.stats.total_seconds, reverse=True)
+        ],
+    }
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+def load_feeds(opml_path: Path) -> list[Feed]:
+    """
+    Collect the feeds to render: the followed Mastodon accounts, the feeds in the OPML file,
+    and the releases of recently starred GitHub repositories.
+    """
+    # Parse OPML file completely with direct XML parsing
+    opml_feeds = parse_opml(opml_path)
+
+    feeds = [
+        Feed.from_mastodon("@malcat@infosec.exchange"),
+        Feed.from_mastodon("@pnx@infosec.exchange"),
+        Feed.from_mastodon("@HexRaysSA@infosec.exchange"),
+        Feed.from_mastodon("@binaryninja@infosec.exchange"),
+    ]
+
+    for feed in opml_feeds:
+        feeds.append(
+            Feed(
+                category="rss",
+                title=feed["title"],
+                url=feed["url"],
+                homepage=feed["homepage"],
+            )
+        )
+
+    github_token = os.getenv("GITHUB_TOKEN")
+
+    # take the 20 most recently updated repos
+    release_feeds = []
+    try:
+        response = get_session().get(
+            "https://api.github.com/users/williballenthin/starred?sort=updated&direction=desc&per_page=20",
+            headers={"Authorization": f"Bearer {github_token}"} if github_token else {},
+            timeout=fetch_timeout,
+        )
+        if response.status_code == 200:
+            repos = response.json()
+
+            for repo in repos:
+                title = repo["full_name"]
+                logger.debug("found repo: %s", title)
+
+                homepage = f"https://github.com/{title}"
+                url = homepage + "/releases.atom"
+                release_feeds.append(
+                    Feed("release", url, homepage=homepage, title=title)
+                )
+        else:
+            logger.warning("failed to fetch GitHub starred repos: HTTP %d", response.status_code)
+    except Exception as e:
+        logger.warning("failed to fetch GitHub starred repos: %s", e, exc_info=True)
+
+    # the GraphQL API requires a token; without one, each repo's releases Atom feed is fetched instead.
+    if github_token and release_feeds:
+        try:
+            fill_github_releases(github_token, release_feeds)
+        except Exception as e:
+            logger.warning("failed to fetch GitHub releases, falling back to Atom feeds: %s", e, exc_info=True)
+
+    feeds.extend(release_feeds)
+
+    return feeds
+
+
+def fill_github_releases(token: str, feeds: list[Feed]):
+    """Set the releases of the given release feeds via `fetch_github_releases`, raising when the request fails."""
+    releases = fetch_github_releases(token, [feed.title for feed in feeds])
+    for feed in feeds:
+        if feed.title in releases:
+            feed.releases = releases[feed.title]
+            # all the releases came from a single successful response.
+            feed.stats.status = 200
+
+
+def refresh_github_releases(feeds: list[Feed], now: datetime.datetime):
+    """
+    Fetch the releases of the release feeds again when any of them is due to be polled.
+
+    `load_feeds` fetches them up front, but --serve only reloads the feeds every `SERVE_RELOAD_DELAY`,
+    so this keeps them on the same schedule as the other feeds. They're all fetched in a single request,
+    so the ones that aren't due yet are refreshed along with those that are.
+    """
+    release_feeds = [feed for feed in feeds if feed.releases is not None]
+    due = [feed for feed in release_feeds if is_due(cache.get_health(feed.url), now, slack=datetime.timedelta(0))]
+    github_token = os.getenv("GITHUB_TOKEN")
+    if not due or not github_token:
+        return
+
+    try:
+        fill_github_releases(github_token, release_feeds)
+    except Exception as e:
+        # render the releases from the last fetch, and back off like any other failing feed.
+        logger.warning("failed to fetch GitHub releases: %s", e, exc_info=True)
+        for feed in due:
+            feed.stats.error = f"fetch: {e}"
+
+
+def main():
+    global cache, fetch_timeout, max_feed_bytes, converter, filter_rules
+
+    parser = argparse.ArgumentParser(description="Render recent entries from followed feeds as an HTML fragment.")
+    parser.add_argument("opml", type=Path, nargs="?", help="path to OPML file of followed feeds")
+    parser.add_argument("--cache", type=Path, help="path to SQLite database used to cache feeds across runs")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="maximum number of feeds to fetch at once")
+    parser.add_argument("--max-per-host", type=int, default=4, help="maximum number of feeds to fetch at once from a single host")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait on a connection or read before giving up on a feed")
+    parser.add_argument("--max-feed-bytes", type=int, default=4 * 1024 * 1024, help="bytes of a feed to download before truncating it, or 0 for no limit (default: 4 MiB)")
+    parser.add_argument("--deadline", type=float, help="seconds after which to stop waiting on feeds and render whatever has arrived")
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument("--record", type=Path, metavar="DIR", help="save every HTTP response to the given directory")
+    archive_group.add_argument("--replay", type=Path, metavar="DIR", help="serve HTTP responses from a directory saved with --record, instead of the network")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of processes used to convert entry content, or 0 to convert in-process (default: number of CPUs)")
+    parser.add_argument("--format", choices=["html", "json"], default="html", help="output format: the HTML fragment included by the homepage, or a JSON Feed (default: html)")
+    parser.add_argument("--json", type=Path, metavar="PATH", help="also write the entries as a JSON Feed to the given file")
+    parser.add_argument("--entry-budget", type=int, default=32 * 1024, help="bytes of content to show per entry before cutting it short with a link to the rest, or 0 for no limit (default: 32 KiB)")
+    parser.add_argument("--total-budget", type=int, default=2 * 1024 * 1024, help="bytes of inline content across all entries, beyond which older entries are shortened further, or 0 for no limit (default: 2 MiB)")
+    parser.add_argument("--entries-dir", type=Path, metavar="DIR", help="write each entry's content to its own file in the given directory, loaded when the entry is opened, rather than inline")
+    parser.add_argument("--entries-url", metavar="URL", help="URL at which the --entries-dir directory is served")
+    parser.add_argument("--report", type=Path, metavar="PATH", help="write per-feed fetch, parse, and conversion stats to the given JSON file")
+    parser.add_argument("--header-profiles", type=Path, metavar="PATH", help="JSON file mapping hosts to extra headers to send with their feed requests, such as a User-Agent")
+    parser.add_argument("--poll-all", action="store_true", help="fetch every feed, even those that the polling schedule in the cache says aren't due")
+    parser.add_argument("--websub-callback", metavar="URL", help="public URL of the --websub-listen receiver; feeds that advertise a WebSub hub are subscribed to, and not polled while subscribed")
+    parser.add_argument("--websub-listen", metavar="HOST:PORT", help="instead of rendering the feeds, run the WebSub receiver, merging content pushed by hubs into the cache")
+    parser.add_argument("--rules", type=Path, default=RULES, metavar="PATH", help=f"TOML file of rules for entries to leave out (default: {RULES.name} alongside this script)")
+    parser.add_argument("--output", "-o", type=Path, metavar="PATH", help="write the output to the given file, atomically, rather than to stdout")
+    parser.add_argument("--serve", action="store_true", help="stay running, polling each feed when it's due and rewriting --output whenever the visible entries change")
+    parser.add_argument("--poll-interval", type=float, default=3600, help="with --serve, the least number of seconds between polls of a feed (default: 1 hour)")
+    args = parser.parse_args()
+
+    import multiprocessing
+    import concurrent.futures
+
+    import requests.adapters
+
+    logging.basicConfig(level=logging.DEBUG)
+
+    if args.entries_dir and not args.entries_url:
+        parser.error("--entries-dir requires --entries-url")
+    if (args.websub_callback or args.websub_listen) and not args.cache:
+        parser.error("--websub-callback and --websub-listen require --cache")
+    if not args.opml and not (args.websub_listen and not args.serve):
+        parser.error("the following arguments are required: opml")
+    if args.serve and not (args.cache and args.output):
+        parser.error("--serve requires --cache and --output")
+    if args.serve and (args.record or args.replay):
+        parser.error("--serve can't be used with --record or --replay")
+
+    try:
+        filter_rules = load_rules(args.rules)
+    except (OSError, ValueError) as e:
+        parser.error(f"failed to load rules: {e}")
+
+    started = time.monotonic()
+
+    deadline = time.monotonic() + args.deadline if args.deadline is not None else None
+
+    fetch_timeout = args.timeout
+    max_feed_bytes = args.max_feed_bytes or None
+
+    if args.cache:
+        cache = Cache(args.cache)
+
+    # wakes up --serve early, when a hub pushes new content.
+    pushed = threading.Event()
+    if args.websub_listen:
+        host, _, port = args.websub_listen.rpartition(":")
+        server = serve_websub(WebSubReceiver(cache, max_bytes=max_feed_bytes, on_receive=pushed.set), (host, int(port)))
+        logger.info("websub: listening on %s:%d", *server.server_address[:2])
+        if not args.serve:
+            server.serve_forever()
+            return
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # at most --max-per-host requests to a host are in flight at once, so that's all the connections worth keeping.
+    pool_options = {"pool_connections": POOL_HOSTS, "pool_maxsize": args.max_per_host}
+    if args.record:
+        archive = HttpArchive(args.record)
+        archive.start(datetime.datetime.now(datetime.timezone.utc))
+        adapter = RecordingAdapter(archive, **pool_options)
+    elif args.replay:
+        archive = HttpArchive(args.replay)
+        adapter = ReplayAdapter(archive, **pool_options)
+    else:
+        adapter = requests.adapters.HTTPAdapter(**pool_options)
+    get_session().mount("http://", adapter)
+    get_session().mount("https://", adapter)
+
+    if args.header_profiles:
+        for host, headers in json.loads(args.header_profiles.read_text(encoding="utf-8")).items():
+            HEADER_PROFILES.setdefault(host.lower(), {}).update(headers)
+
+    if args.workers > 0:
+        # spawn rather than fork, since the pool is first used from the fetch threads.
+        converter = concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def render(entries: list[Entry], generated: datetime.datetime):
+        if args.format == "html":
+            out = io.StringIO()
+            write_html(
+                out,
+                entries,
+                generated,
+                entry_budget=args.entry_budget,
+                total_budget=args.total_budget,
+                entries_dir=args.entries_dir,
+                entries_url=args.entries_url,
+            )
+            text = out.getvalue()
+        else:
+            text = json.dumps(build_json_feed(entries, generated, entry_budget=args.entry_budget), indent=2) + "\n"
+
+        if args.output:
+            write_atomically(args.output, text)
+        else:
+            sys.stdout.write(text)
+
+        if args.json:
+            write_atomically(
+                args.json,
+                json.dumps(build_json_feed(entries, generated, entry_budget=args.entry_budget), indent=2) + "\n",
+            )
+
+    if args.serve:
+        # each pass only fetches the feeds that are due, and parses the rest from the cache,
+        # which is cheap since the process, its connections, and the converter pool stay warm.
+        feeds: list[Feed] = []
+        loaded_at = None
+        rendered = None
+        try:
+            while True:
+                now = datetime.datetime.now(datetime.timezone.utc)
+                pass_started = time.monotonic()
+                try:
+                    if loaded_at is None or now - loaded_at >= SERVE_RELOAD_DELAY:
+                        feeds = load_feeds(args.opml)
+                        loaded_at = now
+                        try:
+                            filter_rules = load_rules(args.rules)
+                        except (OSError, ValueError) as e:
+                            logger.error("failed to reload rules, keeping the previous ones: %s", e)
+                    else:
+                        # new objects, rather than resetting their stats, since the threads of feeds
+                        # that timed out in the last pass may still be writing to the old ones.
+                        feeds = [replace(feed, stats=FeedStats()) for feed in feeds]
+                        refresh_github_releases(feeds, now)
+
+                    entries, _ = poll_feeds(
+                        feeds,
+                        now,
+                        args.max_concurrency,
+                        args.max_per_host,
+                        deadline=time.monotonic() + args.deadline if args.deadline is not None else None,
+                        min_poll_delay=datetime.timedelta(seconds=args.poll_interval),
+                        # there's no fixed schedule of runs to round to.
+                        poll_slack=datetime.timedelta(0),
+                    )
+
+                    if args.websub_callback:
+                        renew_websub_subscriptions(feeds, args.websub_callback, now)
+
+                    key = get_entries_key(entries)
+                    if key != rendered:
+                        render(entries, now)
+                        rendered = key
+                        logger.info("rendered %d entries", len(entries))
+
+                    if args.report:
+                        write_report(args.report, feeds, now, time.monotonic() - pass_started)
+
+                    delay = get_serve_delay(feeds, now)
+                    logger.info(
+                        "fetched %d of %d feeds in %.1fs, sleeping for %s",
+                        sum(1 for feed in feeds if not feed.stats.skipped and feed.releases is None),
+                        len(feeds),
+                        time.monotonic() - pass_started,
+                        delay,
+                    )
+                except Exception as e:
+                    # feeds fail one at a time in fetch_feed, so this is something unexpected, such as a full disk;
+                    # keep serving the last render and try again shortly, rather than exiting.
+                    logger.error("failed to poll feeds: %s", e, exc_info=True)
+                    delay = SERVE_MIN_SLEEP
+
+                pushed.wait(delay.total_seconds())
+                pushed.clear()
+        finally:
+            if converter:
+                converter.shutdown(wait=False, cancel_futures=True)
+
+    feeds = load_feeds(args.opml)
+
+    # TODO
+    # feeds = feeds[:3]
+
+    if args.replay:
+        # filter entries as of the original run, so that replays render the same entries.
+        snapshot_time = archive.recorded_at
+    else:
+        snapshot_time = datetime.datetime.now(datetime.timezone.utc)
+
+    entries, feeds_timed_out = poll_feeds(
+        feeds,
+        snapshot_time,
+        args.max_concurrency,
+        args.max_per_host,
+        deadline=deadline,
+        poll_all=args.poll_all,
+    )
+
+    if converter:
+        # conversions requested by feeds that timed out are no longer needed.
+        converter.shutdown(wait=False, cancel_futures=True)
+
+    if args.websub_callback and not args.replay:
+        requested = renew_websub_subscriptions(feeds, args.websub_callback, snapshot_time)
+        logger.info("requested %d WebSub subscriptions", requested)
+
+    render(entries, snapshot_time)
+
+    logger.info(
+        "skipped fetching %d of %d feeds that weren't due to be polled, %d of them subscribed to via WebSub",
+        sum(1 for feed in feeds if feed.stats.skipped),
+        len(feeds),
+        sum(1 for feed in feeds if feed.stats.skipped and feed.stats.subscribed),
+    )
+
+    if feeds_timed_out:
+        logger.info("=== FEEDS TIMED OUT SUMMARY ===")
+        logger.info("Feeds that did not finish within %.0f seconds (%d):", args.deadline, len(feeds_timed_out))
+        for feed in feeds_timed_out:
+            logger.info("  - %s (%s)", feed.title, feed.url)
+
+    # Summarize feeds with no entries
+    feeds_with_no_entries = [
+        feed for feed in feeds
+        # only feeds that were fetched and parsed; the others are reported above.
+        if (feed.stats.status is not None or feed.stats.skipped) and feed.stats.error is None and not feed.stats.timed_out
+        and feed.stats.recent_entries == 0
+    ]
+    if feeds_with_no_entries:
+        logger.info("=== FEEDS WITH NO ENTRIES SUMMARY ===")
+        no_total_entries = [f for f in feeds_with_no_entries if f.stats.total_entries == 0]
+        no_recent_entries = [f for f in feeds_with_no_entries if f.stats.total_entries > 0]
+
+        if no_total_entries:
+            logger.info("Feeds with no total entries (%d):", len(no_total_entries))
+            for feed in no_total_entries:
+                logger.info("  - %s (%s)", feed.title, feed.url)
+
+        if no_recent_entries:
+            logger.info("Feeds with no recent entries in past %d days (%d):", RECENT_DAYS, len(no_recent_entries))
+            for feed in no_recent_entries:
+                logger.info("  - %s (%d total entries) (%s)", feed.title, feed.stats.total_entries, feed.url)
+    else:
+        logger.info("All feeds have recent entries")
+
+    if args.report:
+        write_report(args.report, feeds, snapshot_time, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1055 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#  "feedparser==6.0.11",
+#  "html2text==2024.2.26",
+#  "markdown==3.7",
+#  "python-dateutil==2.9.0.post0",
+#  "requests==2.32.3",
+#  "pytest",
+# ]
+# ///
+
+import sys
+import json
+import importlib.util
+from pathlib import Path
+from typing import Callable, Optional
+
+import pytest
+import requests
+import feedparser
+
+# gen.py is a script rather than a module, so load it from its path.
+spec = importlib.util.spec_from_file_location("gen", Path(__file__).parent / "gen.py")
+gen = importlib.util.module_from_spec(spec)
+sys.modules["gen"] = gen
+spec.loader.exec_module(gen)
+
+CORPUS = Path(__file__).parent / "corpus"
+
+
+@pytest.mark.parametrize("path", sorted((CORPUS / "entries").glob("*.html")), ids=lambda path: path.stem)
+def test_convert_content_corpus(path):
+    _, content_html, _ = gen.convert_content("html", path.read_text(encoding="utf-8"))
+    assert content_html == (CORPUS / "converted" / path.name).read_text(encoding="utf-8")
+
+
+@pytest.mark.parametrize("path", sorted((CORPUS / "entries").glob("*.html")), ids=lambda path: path.stem)
+def test_tokenizer_round_trip(path):
+    source = path.read_text(encoding="utf-8")
+    tokens = gen.HtmlTokenizer(source).tokenize()
+    assert "".join(token.raw for token in tokens) == source
+
+
+def test_sanitize_heading_wrapped_link():
+    assert gen.sanitize_entry_html('<h3><a href="https://example.com/changelog">Changelog</a></h3>') == "<h3>Changelog</h3>"
+
+
+def test_sanitize_heading_empty_anchor():
+    # Rust Blog
+    content = '<h2 id="x"><a class="anchor" href="#x" aria-hidden="true"></a>\nWhat\'s in 1.78.0 stable</h2>'
+    assert gen.sanitize_entry_html(content) == '<h2 id="x">What\'s in 1.78.0 stable</h2>'
+
+
+def test_sanitize_heading_trailing_permalink():
+    assert gen.sanitize_entry_html('<h1>New Features<a class="headerlink" href="#new">¶</a></h1>') == "<h1>New Features</h1>"
+    assert gen.sanitize_entry_html('<h3>New Features <a href="#new">#</a></h3>') == "<h3>New Features</h3>"
+
+
+def test_sanitize_heading_icon_permalink():
+    # Servo
+    content = '<h2 id="h">Highlights <a class="header-anchor" href="https://servo.org/#h"> <i class="icon"></i></a></h2>'
+    assert gen.sanitize_entry_html(content) == '<h2 id="h">Highlights</h2>'
+
+
+def test_sanitize_heading_inner_link():
+    content = '<h2><a href="https://github.com/o/r/compare/v1...v2">2.0.0</a> (2024-07-09)</h2>'
+    assert gen.sanitize_entry_html(content) == "<h2>2.0.0 (2024-07-09)</h2>"
+
+
+def test_sanitize_heading_does_not_span_headings():
+    content = '<h2>One</h2>\n<p>a\n  b</p>\n<h3>Two <a href="#two">#</a></h3>'
+    assert gen.sanitize_entry_html(content) == '<h2>One</h2>\n<p>a\n  b</p>\n<h3>Two</h3>'
+
+
+def test_sanitize_unclosed_heading():
+    content = '<h2>One <a href="#one">#</a><p>text</p>'
+    assert gen.sanitize_entry_html(content) == content
+
+
+def test_sanitize_marks_doc_tags():
+    assert gen.sanitize_entry_html("<p>the &lt;table&gt; element</p>") == f"<p>the {gen.DOC_TAG_OPEN}table{gen.DOC_TAG_CLOSE} element</p>"
+    # not a documented element name, or has attributes
+    assert gen.sanitize_entry_html("<p>a &lt;foo&gt; b</p>") == "<p>a &lt;foo&gt; b</p>"
+    assert gen.sanitize_entry_html("<p>&lt;iframe srcdoc&gt;</p>") == "<p>&lt;iframe srcdoc&gt;</p>"
+    assert gen.sanitize_entry_html("<p>the &lt;table&gt; element</p>", escape_tags=False) == "<p>the &lt;table&gt; element</p>"
+
+
+def test_convert_html_doc_tags():
+    _, content_html = gen.convert_html("<p>use the &lt;table&gt; element</p>")
+    assert content_html == "<p>use the &lt;table&gt; element</p>"
+
+
+def test_replay_archive(tmp_path):
+    archive = gen.HttpArchive(tmp_path)
+    archive.save("GET", "https://example.com/feed.xml", 200, "OK", {"Content-Type": "application/rss+xml"}, b"<rss/>")
+    archive.save("GET", "https://example.com/old.xml", 301, "Moved", {"Location": "https://example.com/feed.xml"}, b"")
+
+    session = requests.Session()
+    session.mount("https://", gen.ReplayAdapter(archive))
+
+    response = session.get("https://example.com/old.xml")
+    assert response.status_code == 200
+    assert response.url == "https://example.com/feed.xml"
+    assert response.headers["Content-Type"] == "application/rss+xml"
+    assert response.content == b"<rss/>"
+
+    with pytest.raises(requests.ConnectionError):
+        session.get("https://example.com/missing.xml")
+
+
+@pytest.fixture
+def replay(monkeypatch):
+    """Serve the requests of `gen` from an archive, via `gen.ReplayAdapter` or the given subclass of it."""
+
+    def replay(archive, adapter=gen.ReplayAdapter):
+        session = requests.Session()
+        session.mount("https://", adapter(archive))
+        monkeypatch.setattr(gen, "session", session)
+
+    return replay
+
+
+def test_fetch_url_stats(tmp_path, replay):
+    archive = gen.HttpArchive(tmp_path)
+    archive.save("GET", "https://example.com/feed.xml", 200, "OK", {"Content-Type": "application/rss+xml"}, b"<rss/>")
+    archive.save("GET", "https://example.com/missing.xml", 404, "Not Found", {}, b"")
+    archive.save("GET", "https://example.com/old.xml", 301, "Moved Permanently", {"Location": "https://example.com/feed.xml"}, b"")
+
+    replay(archive)
+
+    stats = gen.FeedStats()
+    body, response_headers = gen.fetch_url("https://example.com/feed.xml", {}, stats=stats)
+    assert body == b"<rss/>"
+    assert response_headers["content-type"] == "application/rss+xml"
+    assert stats.status == 200
+    assert stats.bytes == len(body)
+    assert not stats.not_modified
+
+    stats = gen.FeedStats()
+    with pytest.raises(requests.HTTPError):
+        gen.fetch_url("https://example.com/missing.xml", {}, stats=stats)
+    assert stats.status == 404
+
+    # relative links are resolved against where the feed ended up.
+    body, response_headers = gen.fetch_url("https://example.com/old.xml", {})
+    assert body == b"<rss/>"
+    assert response_headers["content-location"] == "https://example.com/feed.xml"
+
+
+def test_fetch_url_not_modified(tmp_path, monkeypatch, replay):
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    url = "https://example.com/feed.xml"
+    gen.cache.put_response(url, '"v1"', "Fri, 22 Nov 2024 10:00:00 GMT", "application/rss+xml", b"<rss/>", location="https://example.com/blog/feed.xml")
+
+    archive = gen.HttpArchive(tmp_path / "archive")
+    archive.start(gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc))
+    # the server rotates the ETag, but not Last-Modified.
+    archive.save("GET", url, 304, "Not Modified", {"ETag": '"v2"'}, b"")
+
+    sent = []
+
+    class Adapter(gen.ReplayAdapter):
+        def send(self, request, **kwargs):
+            sent.append(request.headers)
+            return super().send(request, **kwargs)
+
+    replay(archive, Adapter)
+
+    stats = gen.FeedStats()
+    body, response_headers = gen.fetch_url(url, {}, stats=stats)
+    assert sent[0]["If-None-Match"] == '"v1"'
+    assert sent[0]["If-Modified-Since"] == "Fri, 22 Nov 2024 10:00:00 GMT"
+    assert body == b"<rss/>"
+    assert response_headers["content-type"] == "application/rss+xml"
+    assert response_headers["content-location"] == "https://example.com/blog/feed.xml"
+    assert stats.status == 304
+    assert stats.not_modified
+
+    cached = gen.cache.get_response(url)
+    assert cached["etag"] == '"v2"'
+    assert cached["last_modified"] == "Fri, 22 Nov 2024 10:00:00 GMT"
+    assert cached["body"] == b"<rss/>"
+
+
+def test_poll_delay():
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    day = gen.datetime.timedelta(days=1)
+
+    # posted within the window: every run
+    assert gen.get_poll_delay(now, now - day, 3600, 0) == gen.datetime.timedelta(0)
+    # usually posts daily, but has been quiet for a while
+    assert gen.get_poll_delay(now, now - 10 * day, day.total_seconds(), 0) == day / 4
+    # dormant for months
+    assert gen.get_poll_delay(now, now - 100 * day, 30 * day.total_seconds(), 0) == gen.MAX_POLL_DELAY
+    # failing feeds back off
+    assert gen.get_poll_delay(now, now, 3600, 1) == gen.FAILURE_POLL_DELAY
+    assert gen.get_poll_delay(now, now, 3600, 2) == 2 * gen.FAILURE_POLL_DELAY
+    assert gen.get_poll_delay(now, now, 3600, 1000) == gen.MAX_FAILURE_POLL_DELAY
+
+
+def test_serve_schedule(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    hour = gen.datetime.timedelta(hours=1)
+
+    active = gen.Feed("rss", "https://example.com/active.xml", title="active")
+    active.stats.newest_entry = now - hour
+    quiet = gen.Feed("rss", "https://example.com/quiet.xml", title="quiet")
+    quiet.stats.newest_entry = now - gen.datetime.timedelta(days=100)
+
+    # an active feed would be polled every run, but not every time --serve wakes up.
+    gen.record_health(active, now, min_delay=hour)
+    gen.record_health(quiet, now, min_delay=hour)
+    assert not gen.is_due(gen.cache.get_health(active.url), now + hour / 2, slack=gen.datetime.timedelta(0))
+    assert gen.is_due(gen.cache.get_health(active.url), now + hour, slack=gen.datetime.timedelta(0))
+    assert gen.get_serve_delay([active, quiet], now) == min(hour, gen.SERVE_MAX_SLEEP)
+
+    entry = gen.Entry(timestamp=now, title="t", link="https://example.com/1", content="<p>1</p>", feed=active)
+    same = gen.Entry(timestamp=now, title="t", link="https://example.com/1", content="<p>1</p>", feed=active)
+    edited = gen.Entry(timestamp=now, title="t", link="https://example.com/1", content="<p>2</p>", feed=active)
+    assert gen.get_entries_key([entry]) == gen.get_entries_key([same])
+    assert gen.get_entries_key([entry]) != gen.get_entries_key([edited])
+
+    gen.write_atomically(tmp_path / "out" / "feed.html", "one")
+    gen.write_atomically(tmp_path / "out" / "feed.html", "two")
+    assert [path.name for path in (tmp_path / "out").iterdir()] == ["feed.html"]
+    assert (tmp_path / "out" / "feed.html").read_text() == "two"
+
+
+def test_github_releases(tmp_path, replay):
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+
+    def release(id, tag, published, name=None, description="<p>notes</p>", draft=False):
+        return {
+            "id": id,
+            "name": name,
+            "tagName": tag,
+            "url": f"https://github.com/o/r/releases/tag/{tag}",
+            "isDraft": draft,
+            "createdAt": published,
+            "publishedAt": None if draft else published,
+            "descriptionHTML": description,
+        }
+
+    data = {
+        "repo0": {"releases": {"nodes": [
+            release("R3", "v3", "2024-11-22T10:00:00Z", draft=True),
+            release("R2", "v2", "2024-11-21T10:00:00Z", name="Version 2"),
+            release("R1", "v1", "2024-10-01T10:00:00Z"),
+        ]}},
+        "repo1": None,
+    }
+
+    archive = gen.HttpArchive(tmp_path)
+    archive.save("POST", "https://api.github.com/graphql", 200, "OK", {"Content-Type": "application/json"}, json.dumps({"data": data}).encode())
+    replay(archive)
+
+    releases = gen.fetch_github_releases("token", ["o/r", "o/gone"])
+    assert list(releases) == ["o/r"]
+
+    feed = gen.Feed("release", "https://github.com/o/r/releases.atom", homepage="https://github.com/o/r", title="o/r")
+    entries = list(feed.parse_releases(releases["o/r"], now))
+    assert [(entry.title, entry.link, entry.content) for entry in entries] == [
+        ("Version 2", "https://github.com/o/r/releases/tag/v2", "<p>notes</p>"),
+    ]
+    assert feed.stats.recent_entries == 1
+    assert feed.stats.newest_entry == gen.datetime.datetime(2024, 11, 21, 10, 0, tzinfo=gen.datetime.timezone.utc)
+
+
+def test_refresh_github_releases(tmp_path, monkeypatch, replay):
+    import asyncio
+
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    monkeypatch.setenv("GITHUB_TOKEN", "token")
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    hour = gen.datetime.timedelta(hours=1)
+    release = {
+        "id": "R1",
+        "name": None,
+        "tagName": "v2",
+        "url": "https://github.com/o/r/releases/tag/v2",
+        "isDraft": False,
+        "createdAt": "2024-11-22T10:00:00Z",
+        "publishedAt": "2024-11-22T10:00:00Z",
+        "descriptionHTML": "<p>notes</p>",
+    }
+
+    archive = gen.HttpArchive(tmp_path / "archive")
+    archive.start(now)
+    archive.save("POST", "https://api.github.com/graphql", 200, "OK", {"Content-Type": "application/json"}, json.dumps({"data": {"repo0": {"releases": {"nodes": [release]}}}}).encode())
+    replay(archive)
+
+    feed = gen.Feed("release", "https://github.com/o/r/releases.atom", homepage="https://github.com/o/r", title="o/r")
+    feed.releases = []
+    gen.cache.put_health(feed.url, now, now + hour, None, None, 0)
+
+    # not due yet: rendered from the releases already fetched, without rescheduling the feed.
+    gen.refresh_github_releases([feed], now)
+    assert feed.releases == []
+    assert asyncio.run(gen.fetch_feed(feed, now, asyncio.Semaphore(1), asyncio.Semaphore(1), skip=True)) == []
+    assert feed.stats.skipped
+
+    feed = gen.replace(feed, stats=gen.FeedStats())
+    gen.refresh_github_releases([feed], now + hour)
+    assert [release["tagName"] for release in feed.releases] == ["v2"]
+    assert feed.stats.status == 200
+
+    # a failed refresh keeps the releases, and counts as a failure of the due feeds.
+    replay(gen.HttpArchive(tmp_path / "empty"))
+    feed = gen.replace(feed, stats=gen.FeedStats())
+    gen.refresh_github_releases([feed], now + hour)
+    assert [release["tagName"] for release in feed.releases] == ["v2"]
+    assert feed.stats.error.startswith("fetch: ")
+
+
+def test_write_report(tmp_path):
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    fast = gen.Feed("rss", "https://example.com/fast.xml", title="fast")
+    fast.stats.skipped = True
+    fast.stats.parse_seconds = 0.25
+    slow = gen.Feed("rss", "https://example.com/slow.xml", title="slow")
+    slow.stats.wait_seconds = 1.5
+    slow.stats.transfer_seconds = 0.5
+    slow.stats.newest_entry = now
+    slow.stats.filtered_entries = {"sponsored": 2}
+
+    path = tmp_path / "out" / "report.json"
+    gen.write_report(path, [fast, slow], now, 3.14159)
+    report = json.loads(path.read_text(encoding="utf-8"))
+
+    assert report["generated"] == "2024-11-22T12:00:00+00:00"
+    assert report["duration_seconds"] == 3.142
+    assert report["fetches_skipped"] == 1
+    # slowest first
+    assert [feed["title"] for feed in report["feeds"]] == ["slow", "fast"]
+    assert report["feeds"][0]["total_seconds"] == 2.0
+    assert report["feeds"][0]["newest_entry"] == "2024-11-22T12:00:00+00:00"
+    assert report["feeds"][0]["filtered_entries"] == {"sponsored": 2}
+    assert report["feeds"][1]["newest_entry"] is None
+    assert report["feeds"][1]["filtered_entries"] == {}
+
+
+def test_request_headers():
+    assert gen.get_request_headers("https://example.com/feed.xml") == gen.get_default_headers()
+    assert gen.get_request_headers("https://www.reddit.com/r/ReverseEngineering/.rss")["User-Agent"].startswith("Mozilla/")
+    # not a subdomain
+    assert gen.get_request_headers("https://notreddit.com/.rss") == gen.get_default_headers()
+
+    profiles = {"example.com": {"User-Agent": "a", "X-A": "1"}, "feeds.example.com": {"User-Agent": "b"}}
+    headers = gen.get_request_headers("https://feeds.example.com/rss", profiles)
+    assert headers["User-Agent"] == "b"
+    assert headers["X-A"] == "1"
+
+
+def make_rss(dates: list[str]) -> bytes:
+    items = "".join(f"<item><title>{i}</title><link>https://example.com/{i}</link><pubDate>{date}</pubDate><description>&lt;p&gt;{i}&lt;/p&gt;</description></item>" for i, date in enumerate(dates))
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>t</title><pubDate>Fri, 22 Nov 2024 10:00:00 GMT</pubDate>{items}</channel></rss>'.encode()
+
+
+def test_timestamps():
+    utc = gen.datetime.timezone.utc
+    parser = gen.TimestampParser()
+
+    # midnight at the end of the day is the start of the next, not of the same day.
+    assert parser.parse("Fri, 22 Nov 2024 24:00:00 GMT") == gen.datetime.datetime(2024, 11, 23, 0, 0, tzinfo=utc)
+    assert parser.parse("2024-11-22T24:00:00Z") == gen.datetime.datetime(2024, 11, 23, 0, 0, tzinfo=utc)
+    assert parser.parse("2024-11-22T10:30:00.5+02:00") == gen.datetime.datetime(2024, 11, 22, 8, 30, 0, 500000, tzinfo=utc)
+
+    # the format that worked is tried first next time.
+    assert parser.parse("Fri, 22 Nov 2024 10:00:00 -0500") == gen.datetime.datetime(2024, 11, 22, 15, 0, tzinfo=utc)
+    assert gen.TIMESTAMP_FORMATS[parser.format][0] == "%a, %d %b %Y %H:%M:%S %z"
+
+    # only dateutil makes sense of this one
+    assert parser.parse("November 22, 2024 10:00 UTC") == gen.datetime.datetime(2024, 11, 22, 10, 0, tzinfo=utc)
+    with pytest.raises(ValueError):
+        parser.parse("not a date")
+
+    d = feedparser.parse(make_rss(["Fri, 22 Nov 2024 10:00:00 +0200", "Thu, 21 Nov 2024 24:00:00 GMT"]))
+    assert [parser.parse_entry(entry) for entry in d.entries] == [
+        gen.datetime.datetime(2024, 11, 22, 8, 0, tzinfo=utc),
+        gen.datetime.datetime(2024, 11, 22, 0, 0, tzinfo=utc),
+    ]
+
+
+def test_truncate_feed():
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    recent = ["Fri, 22 Nov 2024 10:00:00 GMT", "Thu, 21 Nov 2024 24:00:00 GMT"]
+    old = [f"Mon, {day:02d} Sep 2024 10:00:00 GMT" for day in range(30, 10, -1)]
+
+    # nothing to cut
+    body = make_rss(recent)
+    assert gen.truncate_feed(body, now) == body
+
+    body = make_rss(recent + old)
+    truncated = gen.truncate_feed(body, now)
+    assert truncated.endswith(b"</item></channel></rss>")
+    d = feedparser.parse(truncated)
+    assert not d.bozo
+    assert [entry.title for entry in d.entries] == [str(i) for i in range(len(recent) + gen.TRUNCATE_AFTER_OLD_ENTRIES)]
+
+    # cut off mid-entry at the byte limit
+    body = make_rss(recent)
+    truncated = gen.truncate_feed(body[:body.index(b"<item><title>1")+20], now, incomplete=True)
+    d = feedparser.parse(truncated)
+    assert not d.bozo
+    assert [entry.title for entry in d.entries] == ["0"]
+
+
+def test_truncate_atom_feed():
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    entries = "".join(f"<entry><title>{i}</title><updated>2024-09-{day:02d}T10:00:00Z</updated></entry>" for i, day in enumerate(range(30, 10, -1)))
+    body = f'<feed xmlns="http://www.w3.org/2005/Atom"><updated>2024-11-22T10:00:00Z</updated>{entries}</feed>'.encode()
+
+    d = feedparser.parse(gen.truncate_feed(body, now))
+    assert not d.bozo
+    assert len(d.entries) == gen.TRUNCATE_AFTER_OLD_ENTRIES
+
+
+def test_fetch_url_max_bytes(tmp_path, replay):
+    archive = gen.HttpArchive(tmp_path)
+    archive.save("GET", "https://example.com/feed.xml", 200, "OK", {"Content-Type": "application/rss+xml"}, b"x" * 200_000)
+
+    replay(archive)
+
+    stats = gen.FeedStats()
+    body, _ = gen.fetch_url("https://example.com/feed.xml", {}, stats=stats, max_bytes=100_000)
+    assert len(body) == 100_000
+    assert stats.capped
+
+
+def test_capped_body_from_cache(tmp_path, monkeypatch, replay):
+    # a body cut off at the byte limit is still known to be cut off when it comes from the cache later,
+    # whether revalidated (304) or not fetched at all (not due).
+    import asyncio
+
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    url = "https://example.com/feed.xml"
+    body = make_rss(["Fri, 22 Nov 2024 10:00:00 GMT", "Fri, 22 Nov 2024 09:00:00 GMT"])
+    limit = body.index(b"<item><title>1") + 30
+
+    def fetch(archive_path, skip=False):
+        replay(gen.HttpArchive(archive_path))
+        # so that the body is parsed, rather than its entries reused.
+        gen.cache.db.execute("DELETE FROM parsed")
+        feed = gen.Feed("rss", url, title="example")
+        entries = asyncio.run(gen.fetch_feed(feed, now, asyncio.Semaphore(1), asyncio.Semaphore(1), skip=skip))
+        return feed, entries
+
+    for name in ("200", "304"):
+        gen.HttpArchive(tmp_path / name).start(now)
+    gen.HttpArchive(tmp_path / "200").save("GET", url, 200, "OK", {"Content-Type": "application/rss+xml", "ETag": '"v1"'}, body)
+    gen.HttpArchive(tmp_path / "304").save("GET", url, 304, "Not Modified", {"ETag": '"v1"'}, b"")
+
+    monkeypatch.setattr(gen, "max_feed_bytes", limit)
+    feed, entries = fetch(tmp_path / "200")
+    assert feed.stats.capped
+    assert [entry.title for entry in entries] == ["0"]
+    monkeypatch.setattr(gen, "max_feed_bytes", None)
+
+    feed, entries = fetch(tmp_path / "304")
+    assert feed.stats.not_modified and feed.stats.capped
+    assert [entry.title for entry in entries] == ["0"]
+
+    feed, entries = fetch(tmp_path / "304", skip=True)
+    assert feed.stats.skipped and feed.stats.capped
+    assert [entry.title for entry in entries] == ["0"]
+
+
+def test_fetch_feed_parse_error(tmp_path, monkeypatch):
+    # a feed that fails to parse is reported like one that fails to fetch, rather than raising.
+    import asyncio
+
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    url = "https://example.com/feed.xml"
+    gen.cache.put_response(url, None, None, "application/rss+xml", make_rss(["Fri, 22 Nov 2024 10:00:00 GMT", "not a date"]))
+
+    feed = gen.Feed("rss", url, title="example")
+    entries = asyncio.run(gen.fetch_feed(feed, now, asyncio.Semaphore(1), asyncio.Semaphore(1), skip=True))
+    assert entries == []
+    assert feed.stats.error.startswith("parse: ")
+
+
+def make_feed(host: str, name: str, wait: Optional[Callable[[], None]] = None) -> "gen.Feed":
+    """A feed whose download calls `wait`, then returns a single recent entry of its own."""
+    url = f"https://{host}/{name}.xml"
+    feed = gen.Feed("rss", url, title=name)
+
+    def download():
+        if wait:
+            wait()
+        body = make_rss(["Fri, 22 Nov 2024 10:00:00 GMT"]).replace(b"https://example.com/", f"https://{host}/{name}/".encode())
+        return body, gen.get_response_headers(url, "application/rss+xml")
+
+    feed.download = download
+    return feed
+
+
+def test_fetch_feeds_host_limit(tmp_path, monkeypatch):
+    # a feed queued behind another of the same host doesn't hold a global slot,
+    # so the feeds of other hosts still go ahead.
+    import asyncio
+    import collections
+    import threading
+
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    lock = threading.Lock()
+    in_flight: collections.Counter = collections.Counter()
+    most: collections.Counter = collections.Counter()
+    other_host_started = threading.Event()
+
+    def downloading(host):
+        def wait():
+            with lock:
+                for key in (host, "*"):
+                    in_flight[key] += 1
+                    most[key] = max(most[key], in_flight[key])
+            try:
+                if host == "b.example":
+                    other_host_started.set()
+                else:
+                    # only finishes once the other host's feed has started alongside it.
+                    assert other_host_started.wait(timeout=5)
+            finally:
+                with lock:
+                    for key in (host, "*"):
+                        in_flight[key] -= 1
+
+        return wait
+
+    feeds = [
+        make_feed("a.example", "a1", downloading("a.example")),
+        make_feed("a.example", "a2", downloading("a.example")),
+        make_feed("b.example", "b1", downloading("b.example")),
+    ]
+    entries, timed_out = asyncio.run(gen.fetch_feeds(feeds, now, max_concurrency=2, max_per_host=1))
+    assert not timed_out
+    assert all(feed.stats.error is None for feed in feeds)
+    assert sorted(entry.feed.title for entry in entries) == ["a1", "a2", "b1"]
+    assert most["a.example"] == 1
+    assert most["*"] == 2
+
+
+def test_fetch_feeds_deadline(tmp_path, monkeypatch):
+    # feeds still downloading (or waiting for a slot) at the deadline are abandoned,
+    # and the entries of the others are kept.
+    import asyncio
+    import threading
+
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    release = threading.Event()
+    started = []
+
+    def never_finishes():
+        started.append("slow")
+        release.wait()
+
+    slow = make_feed("slow.example", "slow", never_finishes)
+    # queued behind the slow feed on the same host.
+    queued = make_feed("slow.example", "queued", lambda: started.append("queued"))
+    fast = [make_feed("a.example", "a"), make_feed("b.example", "b")]
+
+    try:
+        entries, timed_out = asyncio.run(gen.fetch_feeds(
+            [slow, queued, *fast],
+            now,
+            max_concurrency=4,
+            max_per_host=1,
+            deadline=gen.time.monotonic() + 0.5,
+        ))
+    finally:
+        release.set()
+
+    assert sorted(entry.feed.title for entry in entries) == ["a", "b"]
+    assert sorted(feed.title for feed in timed_out) == ["queued", "slow"]
+    assert slow.stats.timed_out and queued.stats.timed_out
+    assert not any(feed.stats.timed_out for feed in fast)
+    assert started == ["slow"]
+
+
+def test_content_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    url = "https://example.com/feed.xml"
+    body = make_rss(["Fri, 22 Nov 2024 10:00:00 GMT", "Fri, 22 Nov 2024 09:00:00 GMT"])
+
+    def parse(body):
+        # so that the entries are converted (or found in the content cache), rather than reused as parsed.
+        gen.cache.db.execute("DELETE FROM parsed")
+        feed = gen.Feed("rss", url, title="example")
+        return feed, list(feed.parse(body, {}, now))
+
+    feed, entries = parse(body)
+    assert feed.stats.converted_entries == 2
+
+    # unchanged content isn't converted again.
+    feed, cached = parse(body)
+    assert feed.stats.converted_entries == 0
+    assert [entry.content for entry in cached] == [entry.content for entry in entries]
+
+    # an edited entry is.
+    feed, edited = parse(body.replace(b"&lt;p&gt;1&lt;/p&gt;", b"&lt;p&gt;one&lt;/p&gt;"))
+    assert feed.stats.converted_entries == 1
+    assert "one" in edited[1].content
+
+    # both versions of the older entry are evicted, but not the newer entry.
+    assert gen.cache.evict_content(gen.datetime.datetime(2024, 11, 22, 9, 30, tzinfo=gen.datetime.timezone.utc)) == 2
+    feed, _ = parse(body)
+    assert feed.stats.converted_entries == 1
+
+
+def test_parse_converts_in_worker_processes(monkeypatch):
+    import multiprocessing
+    import concurrent.futures
+
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    body = make_rss(["Fri, 22 Nov 2024 10:00:00 GMT", "Fri, 22 Nov 2024 09:00:00 GMT"])
+    expected = [entry.content for entry in gen.Feed("rss", "https://example.com/feed.xml", title="example").parse(body, {}, now)]
+
+    # spawned like --workers does, so the workers import gen.py themselves.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as converter:
+        monkeypatch.setattr(gen, "converter", converter)
+        feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+        assert [entry.content for entry in feed.parse(body, {}, now)] == expected
+        assert feed.stats.converted_entries == 2
+
+
+def test_parse_reuses_unchanged_body(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    body = make_rss(["Fri, 22 Nov 2024 10:00:00 GMT", "Mon, 30 Sep 2024 10:00:00 GMT"])
+
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+    entries = list(feed.parse(body, {}, now))
+    assert not feed.stats.reused
+
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+    assert list(feed.parse(body, {}, now)) == entries
+    assert feed.stats.reused
+    assert feed.stats.total_entries == 2
+    assert feed.stats.recent_entries == 1
+
+    # the window moved on
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+    assert list(feed.parse(body, {}, now + gen.datetime.timedelta(days=7))) == []
+    assert feed.stats.reused
+
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+    list(feed.parse(body + b"\n", {}, now))
+    assert not feed.stats.reused
+
+
+def test_merge_feed_entries():
+    def feed(*ids):
+        items = "".join(f"<item><guid>{i}</guid><title>{i}</title></item>" for i in ids)
+        return f'<rss version="2.0"><channel><title>t</title>{items}</channel></rss>'.encode()
+
+    def ids(body):
+        return [item.title for item in feedparser.parse(body).entries]
+
+    # new entries go first, updated ones replace the old, and the oldest fall off.
+    assert ids(gen.merge_feed_entries(feed("c", "b", "a"), feed("e", "b"))) == ["e", "b", "c"]
+    # the whole feed, pushed again
+    assert gen.merge_feed_entries(feed("c", "b", "a"), feed("c", "b", "a")) == feed("c", "b", "a").replace(b"</item><item>", b"</item>\n<item>")
+    assert gen.merge_feed_entries(feed("a"), feed()) == feed("a")
+    assert gen.merge_feed_entries(feed(), feed("a")) == feed("a")
+
+
+def test_websub(tmp_path, monkeypatch):
+    import hmac
+    import threading
+    import http.server
+    import urllib.parse
+
+    cache = gen.Cache(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(gen, "cache", cache)
+    monkeypatch.setattr(gen, "session", requests.Session())
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+
+    # a stand-in for the hub, which accepts subscription requests and otherwise does nothing.
+    requests_to_hub = []
+
+    class Hub(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            requests_to_hub.append(dict(urllib.parse.parse_qsl(body.decode())))
+            self.send_response(202)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    hub = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Hub)
+    receiver = gen.serve_websub(gen.WebSubReceiver(cache), ("127.0.0.1", 0))
+    for server in (hub, receiver):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    hub_url = "http://127.0.0.1:%d/" % hub.server_address[1]
+    callback_url = "http://127.0.0.1:%d/websub" % receiver.server_address[1]
+
+    try:
+        url = "https://example.com/feed.xml"
+        body = (
+            '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel><title>t</title>'
+            f'<atom:link rel="hub" href="{hub_url}"/><atom:link rel="self" href="https://example.com/self.xml"/>'
+            '<item><guid>1</guid><title>one</title><link>https://example.com/1</link><pubDate>Fri, 22 Nov 2024 10:00:00 GMT</pubDate></item>'
+            '</channel></rss>'
+        ).encode()
+        cache.put_response(url, '"v1"', None, "application/rss+xml", body)
+
+        feed = gen.Feed("rss", url, title="example")
+        list(feed.parse(body, {}, now))
+        subscription = cache.get_websub(url)
+        assert (subscription["hub"], subscription["topic"]) == (hub_url, "https://example.com/self.xml")
+        assert not gen.is_subscribed(subscription, now)
+
+        assert gen.renew_websub_subscriptions([feed], callback_url, now) == 1
+        (request,) = requests_to_hub
+        assert request["hub.mode"] == "subscribe"
+        assert request["hub.topic"] == "https://example.com/self.xml"
+        # not asked again while the hub has yet to verify.
+        assert gen.renew_websub_subscriptions([feed], callback_url, now) == 0
+
+        # the callback can't be worked out from the feed
+        assert gen.hashlib.sha256(url.encode()).hexdigest()[:20] not in request["hub.callback"]
+        assert requests.get(callback_url + "/" + gen.hashlib.sha256(url.encode()).hexdigest()[:20], params={
+            "hub.mode": "subscribe", "hub.topic": request["hub.topic"], "hub.challenge": "abc",
+        }).status_code == 404
+
+        # the hub verifies the subscription, for no longer than was asked
+        verification = {
+            "hub.mode": "subscribe",
+            "hub.topic": request["hub.topic"],
+            "hub.challenge": "abc",
+            "hub.lease_seconds": "99999999999",
+        }
+        response = requests.get(request["hub.callback"], params=verification)
+        assert (response.status_code, response.text) == (200, "abc")
+        verified = gen.datetime.datetime.now(gen.datetime.timezone.utc)
+        assert gen.is_subscribed(cache.get_websub(url), verified)
+        assert not gen.is_subscribed(cache.get_websub(url), verified + gen.WEBSUB_LEASE + gen.datetime.timedelta(minutes=1))
+        # and only once
+        assert requests.get(request["hub.callback"], params=verification).status_code == 404
+
+        # renewing a live subscription keeps its callback and secret
+        assert gen.renew_websub_subscriptions([feed], callback_url, verified + gen.WEBSUB_LEASE - gen.datetime.timedelta(days=1)) == 1
+        assert (requests_to_hub[-1]["hub.callback"], requests_to_hub[-1]["hub.secret"]) == (request["hub.callback"], request["hub.secret"])
+        # for some other topic
+        response = requests.get(request["hub.callback"], params={"hub.mode": "subscribe", "hub.topic": "x", "hub.challenge": "abc"})
+        assert response.status_code == 404
+
+        # and pushes a new entry
+        pushed = body.replace(b"<guid>1</guid><title>one", b"<guid>2</guid><title>two")
+        signature = "sha256=" + hmac.new(request["hub.secret"].encode(), pushed, "sha256").hexdigest()
+        response = requests.post(request["hub.callback"], data=pushed, headers={"X-Hub-Signature": signature})
+        assert response.status_code == 202
+        cached = cache.get_response(url)
+        assert cached["etag"] == '"v1"'
+        assert [entry.title for entry in feedparser.parse(cached["body"]).entries] == ["two"]
+
+        # a forgery is acknowledged, but ignored
+        response = requests.post(request["hub.callback"], data=body, headers={"X-Hub-Signature": "sha256=00"})
+        assert response.status_code == 202
+        assert cache.get_response(url)["body"] == cached["body"]
+
+        # unknown callback
+        assert requests.post(callback_url + "/nope", data=body).status_code == 410
+    finally:
+        hub.shutdown()
+        receiver.shutdown()
+
+
+def test_entry_keys():
+    assert gen.canonicalize_link("https://www.Example.com/post/?utm_source=x&b=2&a=1#comments") == "example.com/post?a=1&b=2"
+    assert gen.canonicalize_link("http://example.com/post") == gen.canonicalize_link("https://example.com/post/")
+    assert gen.get_title_fingerprint("v1.2.0") is None
+    assert gen.get_title_fingerprint("Release 1.2.0") is None
+    assert gen.get_title_fingerprint("Version 2.1.0") is None
+    assert gen.get_title_fingerprint("Reversing a Firmware Update, Part 2") == "reversing a firmware update part 2"
+
+    post = (
+        '<p>new post by <a href="https://other.social/@author" class="u-url mention">@author</a>: '
+        '<a href="https://blog.example.com/firmware/?utm_source=mastodon">blog.example.com/firmware</a> '
+        '<a href="https://infosec.exchange/tags/re" class="mention hashtag">#re</a></p>'
+    )
+    assert gen.get_entry_keys("https://infosec.exchange/@me/1", None, shared=post) == [
+        "link:infosec.exchange/@me/1",
+        "link:blog.example.com/firmware",
+    ]
+
+
+def test_entry_index():
+    blog = gen.Feed("rss", "https://blog.example.com/feed.xml", title="blog")
+    release = gen.Feed("release", "https://github.com/o/r/releases.atom", title="o/r")
+    toots = gen.Feed("mastodon", "https://infosec.exchange/@me.rss", title="@me")
+    other = gen.Feed("mastodon", "https://infosec.exchange/@other.rss", title="@other")
+    index = gen.EntryIndex([toots, other, blog, release])
+
+    # the post arrives first, then the blog entry it links to supersedes it.
+    toot_keys = gen.get_entry_keys("https://infosec.exchange/@me/1", None, shared='<a href="https://blog.example.com/firmware">')
+    assert index.claim(toots, "https://infosec.exchange/@me/1", toot_keys)
+    assert index.claim(blog, "https://blog.example.com/firmware", gen.get_entry_keys("https://blog.example.com/firmware", "Reversing a Firmware Update"))
+    # and a later post sharing it again is dropped up front.
+    assert not index.claim(other, "https://infosec.exchange/@other/2", gen.get_entry_keys("https://infosec.exchange/@other/2", None, shared='<a href="https://blog.example.com/firmware/">'))
+    # the same title, via the releases of the project
+    assert not index.claim(release, "https://github.com/o/r/releases/tag/v2", gen.get_entry_keys("https://github.com/o/r/releases/tag/v2", "Reversing a firmware update!"))
+    assert index.claim(release, "https://github.com/o/r/releases/tag/v3", gen.get_entry_keys("https://github.com/o/r/releases/tag/v3", "v3"))
+
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    entries = [
+        gen.Entry(timestamp=now, title="new post", link="https://infosec.exchange/@me/1", content="", feed=toots),
+        gen.Entry(timestamp=now, title="Reversing a Firmware Update", link="https://blog.example.com/firmware", content="", feed=blog),
+        gen.Entry(timestamp=now, title="v3", link="https://github.com/o/r/releases/tag/v3", content="", feed=release),
+    ]
+    kept = index.resolve(entries)
+    assert [entry.feed.title for entry in kept] == ["blog", "o/r"]
+    assert kept[0].duplicates == [
+        ("@me", "https://infosec.exchange/@me/1"),
+        ("@other", "https://infosec.exchange/@other/2"),
+        ("o/r", "https://github.com/o/r/releases/tag/v2"),
+    ]
+    assert (toots.stats.duplicate_entries, other.stats.duplicate_entries, release.stats.duplicate_entries) == (1, 1, 1)
+
+    # the same feed listed twice, as in the OPML file and as a starred repository
+    listed = gen.Feed("rss", "https://github.com/o/r/releases.atom", title="o/r releases")
+    starred = gen.Feed("release", "https://github.com/o/r/releases.atom", title="o/r")
+    index = gen.EntryIndex([starred, listed])
+    link = "https://github.com/o/r/releases/tag/v4"
+    assert index.claim(starred, link, gen.get_entry_keys(link, "v4"))
+    assert index.claim(listed, link, gen.get_entry_keys(link, "v4"))
+    kept = index.resolve([
+        gen.Entry(timestamp=now, title="v4", link=link, content="", feed=starred),
+        gen.Entry(timestamp=now, title="v4", link=link, content="", feed=listed),
+    ])
+    assert [entry.feed.title for entry in kept] == ["o/r releases"]
+    assert kept[0].duplicates == [("o/r", link)]
+
+    # unrelated starred repositories that publish the same release name
+    x = gen.Feed("release", "https://github.com/a/x/releases.atom", title="a/x")
+    y = gen.Feed("release", "https://github.com/b/y/releases.atom", title="b/y")
+    index = gen.EntryIndex([x, y])
+    for feed in (x, y):
+        link = f"https://github.com/{feed.title}/releases/tag/v1.2.0"
+        assert index.claim(feed, link, gen.get_entry_keys(link, "Release 1.2.0"))
+    assert (x.stats.duplicate_entries, y.stats.duplicate_entries) == (0, 0)
+
+
+def test_parse_skips_duplicates_before_conversion():
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    body = make_rss(["Fri, 22 Nov 2024 10:00:00 GMT", "Fri, 22 Nov 2024 09:00:00 GMT"])
+    first = gen.Feed("rss", "https://example.com/feed.xml", title="first")
+    mirror = gen.Feed("rss", "https://mirror.example.com/feed.xml", title="mirror")
+    index = gen.EntryIndex([first, mirror])
+
+    assert len(list(first.parse(body, {}, now, index))) == 2
+    assert list(mirror.parse(body, {}, now, index)) == []
+    assert mirror.stats.converted_entries == 0
+    assert mirror.stats.duplicate_entries == 2
+
+
+def test_rules(tmp_path):
+    feed = gen.Feed("release", "https://github.com/ghostty-org/ghostty/releases.atom", title="ghostty-org/ghostty")
+    other = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+
+    # the rules that ship with the script
+    rules = gen.load_rules(gen.RULES)
+    assert any(rule.matches(feed, "Ghostty Tip (abc123)", None, None) for rule in rules)
+    assert any(rule.matches(other, "nightly", None, None) for rule in rules)
+    assert not any(rule.matches(feed, "v1.1.0", None, None) for rule in rules)
+
+    path = tmp_path / "rules.toml"
+    path.write_text(
+        '[[rule]]\n'
+        'name = "sponsored"\n'
+        'feed = "https://example.com/feed.xml"\n'
+        'title_regex = "(?i)^sponsored:"\n'
+        'author = "marketing"\n'
+        '[[rule]]\n'
+        'link_contains = "/podcast/"\n'
+    )
+    sponsored, podcast = gen.load_rules(path)
+    assert sponsored.matches(other, "Sponsored: a product", None, "marketing")
+    assert not sponsored.matches(other, "Sponsored: a product", None, None)
+    assert not sponsored.matches(feed, "Sponsored: a product", None, "marketing")
+    assert podcast.name == "rule 2"
+    assert podcast.matches(feed, None, "https://example.com/podcast/1", None)
+
+    for text in ['[[rule]]\nname = "empty"\n', '[[rule]]\ntitle_startswith = "a"\n', '[[rule]]\ntitle_regex = "("\n', 'rules = []\n']:
+        path.write_text(text)
+        with pytest.raises(ValueError):
+            gen.load_rules(path)
+
+
+def test_parse_filters_before_conversion(tmp_path, monkeypatch):
+    path = tmp_path / "rules.toml"
+    path.write_text('[[rule]]\nname = "zero"\nlink_regex = "/0$"\n')
+    monkeypatch.setattr(gen, "filter_rules", gen.load_rules(path))
+
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    body = make_rss(["Fri, 22 Nov 2024 10:00:00 GMT", "Fri, 22 Nov 2024 09:00:00 GMT"])
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+    assert [entry.title for entry in feed.parse(body, {}, now)] == ["1"]
+    assert feed.stats.converted_entries == 1
+    assert feed.stats.filtered_entries == {"zero": 1}
+
+    # the counts are kept when the entries of an unchanged body are reused.
+    monkeypatch.setattr(gen, "cache", gen.Cache(tmp_path / "cache.sqlite"))
+    list(gen.Feed("rss", feed.url, title="example").parse(body, {}, now))
+    feed = gen.Feed("rss", feed.url, title="example")
+    assert [entry.title for entry in feed.parse(body, {}, now)] == ["1"]
+    assert feed.stats.reused
+    assert feed.stats.filtered_entries == {"zero": 1}
+
+
+def test_entry_fragments(tmp_path):
+    name = gen.write_entry_fragment(tmp_path, "<p>one</p>")
+    assert (tmp_path / name).read_text(encoding="utf-8") == "<p>one</p>"
+    # content-addressed
+    assert gen.write_entry_fragment(tmp_path, "<p>one</p>") == name
+    other = gen.write_entry_fragment(tmp_path, "<p>two</p>")
+    assert other != name
+
+    assert gen.prune_entry_fragments(tmp_path, {other}) == 1
+    assert [path.name for path in tmp_path.iterdir()] == [other]
+
+
+def test_write_html_entry_fragments(tmp_path):
+    import io
+
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+    entries = [
+        gen.Entry(timestamp=now, title="one", link="https://example.com/1", content="<p>one</p>", feed=feed),
+        gen.Entry(timestamp=now, title="two", link="https://example.com/2", content="<p>two</p>", feed=feed),
+    ]
+    entries_dir = tmp_path / "entries"
+    stale = gen.write_entry_fragment(entries_dir, "<p>from the last run</p>")
+
+    out = io.StringIO()
+    gen.write_html(out, entries, now, entries_dir=entries_dir, entries_url="/feed/entries/")
+    output = out.getvalue()
+
+    names = sorted(path.name for path in entries_dir.iterdir())
+    assert len(names) == 2 and stale not in names
+    assert sorted((entries_dir / name).read_text(encoding="utf-8") for name in names) == ["<p>one</p>", "<p>two</p>"]
+    for name in names:
+        # loaded by the script when opened, with a plain link in case it doesn't run.
+        assert f'<div class="content" data-src="/feed/entries/{name}">' in output
+        assert f'<a href="/feed/entries/{name}">show content</a>' in output
+    assert "<p>one</p>" not in output
+    assert gen.LAZY_CONTENT_SCRIPT in output
+
+
+def test_excerpt_html():
+    link = "https://example.com/post?a=1&b=2"
+    content = "<p>one two three</p><ul><li>four <b>five six</b></li><li>seven</li></ul><p>eight</p>"
+    assert gen.excerpt_html(content, len(content), link) == content
+
+    excerpt = gen.excerpt_html(content, 42, link)
+    assert excerpt == '<p>one two three</p><ul><li>four <b>five…</b></li></ul><p class="continue-reading"><a href="https://example.com/post?a=1&amp;b=2">continue reading</a></p>'
+
+    # no empty elements at the cut
+    excerpt = gen.excerpt_html(content, 38, link)
+    assert excerpt.startswith('<p>one two three</p><ul><li>four </li></ul><p class="continue-reading">')
+
+    # just the link
+    assert gen.excerpt_html(content, 0, link).startswith('<p class="continue-reading">')
+
+
+@pytest.mark.parametrize("path", sorted((CORPUS / "converted").glob("*.html")), ids=lambda path: path.stem)
+def test_excerpt_html_closes_tags(path):
+    excerpt = gen.excerpt_html(path.read_text(encoding="utf-8"), 1024, "https://example.com/")
+
+    open_tags = []
+    for token in gen.HtmlTokenizer(excerpt).tokenize():
+        if token.kind == "start" and token.tag not in gen.VOID_TAGS:
+            open_tags.append(token.tag)
+        elif token.kind == "end":
+            assert open_tags.pop() == token.tag
+    assert open_tags == []
+
+
+def test_budget_entries_shortens_older_days_first():
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example")
+    day = gen.datetime.timedelta(days=1)
+    now = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    content = "<p>" + "word " * 400 + "</p>"
+    entries = [gen.Entry(now - i * day, f"{i}", f"https://example.com/{i}", content, feed) for i in range(3)]
+
+    contents = gen.budget_entries(entries, None, 2 * len(content) + 1024)
+    assert contents[id(entries[0])] == content
+    assert contents[id(entries[1])] == content
+    assert len(contents[id(entries[2])]) < gen.EXCERPT_MIN_BYTES + 200
+
+
+def test_clean_entry_html():
+    content = (
+        '<p style="color: red" onclick="x()">text<script>alert("</p>")</script></p>'
+        '<iframe src="https://example.com/embed"><p>fallback</p></iframe>'
+        '<svg><svg></svg><text>drawing</text></svg>'
+        '<section><p>kept <a href="javascript:x()" class="mention">link</a></p></section>'
+        '<img src="data:image/png;base64,AAAA" alt="inline" />'
+        '<img src="https://example.com/a.png" alt="a &amp; b" width="10" />'
+        '<!-- comment -->'
+    )
+    cleaned, removed = gen.clean_entry_html(content)
+    assert cleaned == (
+        '<p>text</p>'
+        '<p>kept <a class="mention">link</a></p>'
+        '<img src="https://example.com/a.png" alt="a &amp; b" width="10" loading="lazy" decoding="async" />'
+    )
+    assert removed > 0
+
+    # already clean
+    assert gen.clean_entry_html("<p>a <em>b</em></p>") == ("<p>a <em>b</em></p>", 0)
+
+
+def test_json_feed():
+    feed = gen.Feed("rss", "https://example.com/feed.xml", title="example", homepage="https://example.com/")
+    generated = gen.datetime.datetime(2024, 11, 22, 12, 0, tzinfo=gen.datetime.timezone.utc)
+    entries = [
+        gen.Entry(gen.datetime.datetime(2024, 11, 21, 10, 0, tzinfo=gen.datetime.timezone.utc), "old", "https://example.com/old", "<p>old</p>", feed),
+        gen.Entry(gen.datetime.datetime(2024, 11, 22, 10, 0, tzinfo=gen.datetime.timezone.utc), "new", "https://example.com/new", "<p>new</p>", feed),
+    ]
+
+    document = json.loads(json.dumps(gen.build_json_feed(entries, generated)))
+    assert document["version"] == "https://jsonfeed.org/version/1.1"
+    assert [item["title"] for item in document["items"]] == ["new", "old"]
+    assert document["items"][0]["content_html"] == "<p>new</p>"
+    assert document["items"][0]["authors"] == [{"name": "example", "url": "https://example.com/"}]
+    assert document["_static_rss"]["days"] == [
+        {"date": "2024-11-22", "items": ["https://example.com/new"]},
+        {"date": "2024-11-21", "items": ["https://example.com/old"]},
+    ]
+
+
+def test_import_is_light():
+    # importing gen must not pull in the heavy dependencies, configure logging, or touch the network.
+    import subprocess
+
+    code = (
+        "import sys, logging, importlib.util\n"
+        f"spec = importlib.util.spec_from_file_location('gen', {str(Path(__file__).parent / 'gen.py')!r})\n"
+        "gen = importlib.util.module_from_spec(spec)\n"
+        "sys.modules['gen'] = gen\n"
+        "spec.loader.exec_module(gen)\n"
+        "heavy = {'asyncio', 'sqlite3', 'requests', 'urllib3', 'feedparser', 'markdown', 'html2text', 'dateutil'}\n"
+        "print(sorted(heavy & set(sys.modules)), logging.getLogger().handlers, gen.session)\n"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[] [] None"